@@ -0,0 +1,135 @@
+'''
+Multi-process oversell stress test for the ticket claim path.
+
+Every worker process runs its own app against one shared SQLite file and keeps
+booking a single ticket type until it sells out. Afterwards the database must
+show exactly `capacity` tickets sold - not one more - and the counters must
+agree with the bookings table.
+
+Run from the projectfile directory:
+    python -m benchmarks.booking_stress --processes 8 --capacity 2000
+'''
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def make_app(db_path, **config):
+    from website import create_app
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        # wait for the write lock instead of failing with "database is locked"
+        'SQLITE_BUSY_TIMEOUT': 60000,
+        **config,
+    })
+
+
+def setup_database(db_path, capacity, processes):
+    from website import db
+    from website.models import User, Genre, Event, ticket_type
+    app = make_app(db_path)
+    with app.app_context():
+        db.create_all()
+        genre = Genre(name='Stress')
+        creator = User(firstName='Stress', surname='Creator', email='creator@stress.test',
+                       mobileNumber='0400000000', streetAddress='1 Test Street', password_hash='x')
+        db.session.add_all([genre, creator])
+        db.session.flush()
+        buyers = [User(firstName='Buyer', surname=str(i), email=f'buyer{i}@stress.test',
+                       mobileNumber=f'04{i:08d}', streetAddress='1 Test Street', password_hash='x')
+                  for i in range(1, processes + 1)]
+        db.session.add_all(buyers)
+        event = Event(name='Flash Sale', start_datetime=datetime.now() + timedelta(days=30),
+                      location='Brisbane', genre_id=genre.id, created_by=creator.id,
+                      remaining_count=capacity)
+        db.session.add(event)
+        db.session.flush()
+        ticket = ticket_type(event_id=event.id, type_name='General Admission', price=50.0,
+                             quantity_available=capacity)
+        db.session.add(ticket)
+        db.session.commit()
+        return event.id, ticket.id, [buyer.id for buyer in buyers]
+
+
+def worker(args):
+    db_path, event_id, ticket_id, user_id, max_quantity, seed = args
+    from website import db
+    from website.models import Event
+    from website.inventory import place_order, InsufficientTickets
+    app = make_app(db_path)
+    rng = random.Random(seed)
+    booked = orders = rejected = 0
+    with app.app_context():
+        event = db.session.get(Event, event_id)
+        started = time.time()
+        while True:
+            quantity = rng.randint(1, max_quantity)
+            item = {'ticket_type_id': ticket_id, 'ticket_type_name': 'General Admission',
+                    'price': 50, 'quantity': quantity, 'subtotal': 50 * quantity}
+            try:
+                place_order(user_id, event, [item])
+                db.session.commit()
+                booked += quantity
+                orders += 1
+            except InsufficientTickets:
+                db.session.rollback()
+                rejected += 1
+                # Sold out for every quantity, not just this one: stop
+                if quantity == 1:
+                    break
+    return booked, orders, rejected, started, time.time()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--capacity', type=int, default=2000)
+    parser.add_argument('--max-quantity', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'stress.sqlite')
+        event_id, ticket_id, buyer_ids = setup_database(db_path, args.capacity, args.processes)
+        jobs = [(db_path, event_id, ticket_id, buyer_id, args.max_quantity, seed)
+                for seed, buyer_id in enumerate(buyer_ids)]
+
+        with multiprocessing.get_context('spawn').Pool(args.processes) as pool:
+            results = pool.map(worker, jobs)
+        # Measured from the first booking attempt to the last, leaving out process start-up
+        elapsed = max(result[4] for result in results) - min(result[3] for result in results)
+
+        booked = sum(result[0] for result in results)
+        orders = sum(result[1] for result in results)
+        rejected = sum(result[2] for result in results)
+
+        from website import db
+        from website.models import Booking, ticket_type
+        from website.counters import check_ticket_counters
+        app = make_app(db_path)
+        with app.app_context():
+            ticket = db.session.get(ticket_type, ticket_id)
+            in_bookings = db.session.scalar(db.select(db.func.coalesce(db.func.sum(Booking.quantity), 0)))
+            problems = check_ticket_counters()
+
+        oversold = in_bookings - args.capacity
+        print(f"processes:          {args.processes}")
+        print(f"capacity:           {args.capacity}")
+        print(f"tickets booked:     {booked} (bookings table: {in_bookings})")
+        print(f"quantity left:      {ticket.quantity_available}")
+        print(f"oversold:           {max(oversold, 0)}")
+        print(f"orders committed:   {orders} ({rejected} rejected)")
+        print(f"elapsed:            {elapsed:.2f}s")
+        print(f"bookings/second:    {orders / elapsed:.1f}")
+        for problem in problems:
+            print(f"counter mismatch:   {problem}")
+        if oversold != 0 or ticket.quantity_available != 0 or booked != in_bookings or problems:
+            raise SystemExit("FAILED")
+        print("OK: zero oversell")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+'''
+Per-request commits versus the group-commit booking writer.
+
+Runs the same flash sale twice in one process against a fresh SQLite file: many
+request threads each booking one ticket at a time, first with a commit per booking,
+then with BOOKING_GROUP_COMMIT queuing them to the single batching writer. Reports
+throughput and booking latency percentiles for both.
+
+Run from the projectfile directory:
+    python -m benchmarks.group_commit --threads 32 --bookings 50
+'''
+import argparse
+import os
+import tempfile
+import threading
+import time
+from .booking_stress import make_app, setup_database
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(mode, threads, bookings, tmp):
+    from website import db
+    from website.models import Event
+    from website.booking_writer import commit_order
+    from website.counters import check_ticket_counters
+    db_path = os.path.join(tmp, f'{mode}.sqlite')
+    capacity = threads * bookings
+    event_id, ticket_id, buyer_ids = setup_database(db_path, capacity, threads)
+    app = make_app(db_path, BOOKING_GROUP_COMMIT=(mode == 'group'),
+                   # every request thread holds a connection, plus one for the writer
+                   DB_POOL_SIZE=threads + 1)
+    latencies = []
+    failures = []
+    start = threading.Barrier(threads)
+
+    def request_thread(user_id):
+        item = {'ticket_type_id': ticket_id, 'ticket_type_name': 'General Admission',
+                'price': 50, 'quantity': 1, 'subtotal': 50}
+        mine = []
+        with app.app_context():
+            event = db.session.get(Event, event_id)
+            start.wait()
+            for _ in range(bookings):
+                began = time.perf_counter()
+                try:
+                    commit_order(user_id, event, [item])
+                except Exception as e:
+                    db.session.rollback()
+                    failures.append(e)
+                mine.append(time.perf_counter() - began)
+        latencies.extend(mine)
+
+    workers = [threading.Thread(target=request_thread, args=(user_id,)) for user_id in buyer_ids]
+    began = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - began
+
+    with app.app_context():
+        if 'booking_writer' in app.extensions:
+            app.extensions['booking_writer'].stop()
+        problems = check_ticket_counters()
+        left = db.session.get(Event, event_id).remaining_count
+    return {
+        'mode': mode,
+        'bookings': len(latencies) - len(failures),
+        'failures': len(failures),
+        'per_second': (len(latencies) - len(failures)) / elapsed,
+        'p50': percentile(latencies, 50) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+        'ok': not failures and not problems and left == 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--bookings', type=int, default=50, help='bookings per thread')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [run(mode, args.threads, args.bookings, tmp) for mode in ('per-request', 'group')]
+
+    print(f"{'mode':<12} {'bookings':>9} {'failed':>7} {'per sec':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for result in results:
+        print(f"{result['mode']:<12} {result['bookings']:>9} {result['failures']:>7} {result['per_second']:>9.1f} "
+              f"{result['p50']:>8.2f} {result['p99']:>8.2f}")
+    if not all(result['ok'] for result in results):
+        raise SystemExit("FAILED: bookings failed or counters disagree")
+
+
+if __name__ == '__main__':
+    main()
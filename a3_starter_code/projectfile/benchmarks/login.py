@@ -0,0 +1,126 @@
+'''
+Login throughput benchmark: bcrypt in the request threads vs the hashing pool.
+
+Creates users whose passwords are hashed at --rounds, then for each mode keeps
+--threads test clients posting correct logins for --seconds while one more
+thread requests a cheap page (the genre list) to show what a login burst does to
+other routes. Reports logins per second, logins per second per core used for
+hashing, login p50/p99 and the cheap page's p99.
+
+Modes: "inline" hashes in the request thread (PASSWORD_HASH_WORKERS=0), "pool"
+in --workers hashing processes.
+
+Run from the projectfile directory:
+    python -m benchmarks.login --rounds 12 --threads 16 --workers 2
+'''
+import argparse
+import os
+import tempfile
+import threading
+import time
+import bcrypt
+from .booking_stress import make_app
+from .group_commit import percentile
+
+PASSWORD = 'password'
+
+
+def setup_database(db_path, users, rounds):
+    from website import db
+    from website.models import User
+    from website.schema import upgrade_schema
+    app = make_app(db_path)
+    with app.app_context():
+        upgrade_schema()
+        # One hash shared by every user: the benchmark is the checking, not the setup
+        # (example.com addresses: the login form's email validator rejects .test domains)
+        password_hash = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+        db.session.add_all([User(firstName='Login', surname=str(i), email=f'login{i}@example.com',
+                                 mobileNumber=f'04{i:08d}', streetAddress='1 Test Street',
+                                 password_hash=password_hash)
+                            for i in range(users)])
+        db.session.commit()
+
+
+def run(db_path, rounds, workers, threads, users, seconds):
+    app = make_app(db_path, WTF_CSRF_ENABLED=False, BCRYPT_LOG_ROUNDS=rounds, PASSWORD_HASH_WORKERS=workers)
+    # Start the pool before timing, like a server that has already served a login
+    with app.test_request_context():
+        from website.passwords import hash_password
+        hash_password(PASSWORD)
+
+    logins, probes = [], []
+    errors = [0]
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def login_loop(number):
+        client = app.test_client()
+        data = {'email': f'login{number % users}@example.com', 'password': PASSWORD}
+        latencies, failed = [], 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            response = client.post('/login', data=data)
+            latencies.append(time.perf_counter() - started)
+            # A successful login redirects; a wrong password or an overload re-renders the form
+            if response.status_code != 302:
+                failed += 1
+        with lock:
+            logins.extend(latencies)
+            errors[0] += failed
+
+    def probe_loop():
+        client = app.test_client()
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.get('/api/v1/genres')
+            probes.append(time.perf_counter() - started)
+            time.sleep(0.01)
+
+    loops = [threading.Thread(target=login_loop, args=(number,)) for number in range(threads)]
+    loops.append(threading.Thread(target=probe_loop))
+    began = time.perf_counter()
+    for loop in loops:
+        loop.start()
+    time.sleep(seconds)
+    stop.set()
+    for loop in loops:
+        loop.join()
+    elapsed = time.perf_counter() - began
+    return logins, errors[0], probes, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt cost of the stored hashes')
+    parser.add_argument('--threads', type=int, default=16, help='concurrent login clients')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help='hashing processes in pool mode')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--mode', choices=['inline', 'pool', 'both'], default='both')
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    modes = []
+    if args.mode in ('inline', 'both'):
+        # bcrypt releases the GIL, so inline hashing can use a core per request thread
+        modes.append(('inline', 0, min(args.threads, cpus)))
+    if args.mode in ('pool', 'both'):
+        modes.append(('pool', args.workers, min(args.workers, cpus)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'login.sqlite')
+        setup_database(db_path, args.users, args.rounds)
+        print(f"bcrypt cost {args.rounds}, {args.threads} login threads, {args.seconds:g}s per mode, {cpus} cpus")
+        print(f"{'mode':<8} {'cores':>5} {'logins':>7} {'err':>4} {'per sec':>8} {'per core':>9} "
+              f"{'p50 ms':>8} {'p99 ms':>8} {'other p99 ms':>13}")
+        for mode, workers, cores in modes:
+            logins, errors, probes, elapsed = run(db_path, args.rounds, workers, args.threads, args.users, args.seconds)
+            per_second = len(logins) / elapsed
+            print(f"{mode:<8} {cores:>5} {len(logins):>7} {errors:>4} {per_second:>8.1f} {per_second / cores:>9.1f} "
+                  f"{percentile(logins, 50) * 1000:>8.1f} {percentile(logins, 99) * 1000:>8.1f} "
+                  f"{percentile(probes, 99) * 1000:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
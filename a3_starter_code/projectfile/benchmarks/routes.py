@@ -0,0 +1,321 @@
+'''
+End-to-end benchmark of the app's hot routes against a seeded database.
+
+Builds a database with `flask seed` data (or copies --database), then times each
+route two ways: sequentially through the Flask test client, and under load from
+several processes sending HTTP requests to a threaded server. Reports requests per
+second, p50/p95/p99 latency and SQL queries per request (from X-Query-Count).
+
+--save writes the results as a JSON baseline; --compare reads one back and
+flags routes that got slower, lost throughput or run more queries (exit 1).
+Use the same seed and sizes when comparing, and the same machine.
+
+Run from the projectfile directory:
+    python -m benchmarks.routes --save benchmarks/baseline.json
+    python -m benchmarks.routes --compare benchmarks/baseline.json
+'''
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+from .booking_stress import make_app
+from .group_commit import percentile
+
+GENRES = ['Blues', 'Classical', 'Country', 'Electronic', 'Funk', 'Hip Hop',
+          'Jazz', 'Metal', 'Pop', 'R&B', 'Reggae', 'Rock']
+# Settings for every app the benchmark starts: query counts in a header, no CSRF tokens to scrape,
+# and bcrypt in the request thread (the HTTP server is a daemonic process, which can't start a
+# hashing pool, and the one login isn't timed)
+BENCH_CONFIG = {'METRICS_QUERY_HEADER': True, 'WTF_CSRF_ENABLED': False, 'PASSWORD_HASH_WORKERS': 0}
+# Where a booking POST should redirect; anywhere else (e.g. /login) means it didn't book
+BOOKED = ('/checkout', '/booking-confirmation/')
+# Tickets added to the booked ticket type so the run can't sell it out
+RESTOCK = 1_000_000
+
+
+def scenarios(target):
+    '''
+    (name, method, path, form data, logged in, expected status, expected redirect) for each
+    benchmarked route; the redirect is None or the Location path fragments that count as success
+    '''
+    book = {f"quantity_{target['ticket_id']}": '1', 'submit': 'Proceed to Checkout'}
+    return [
+        ('main.index', 'GET', '/', None, False, 200, None),
+        ('event.allevents', 'GET', '/events/eventspage', None, False, 200, None),
+        ('event.allevents search', 'GET', '/events/eventspage?' + urlencode({'search': target['search']}), None, False, 200, None),
+        ('event.allevents genre', 'GET', '/events/eventspage?' + urlencode({'genre': target['genre']}), None, False, 200, None),
+        ('event.details', 'GET', f"/events/{target['event_id']}", None, False, 200, None),
+        ('event.book_tickets POST', 'POST', f"/events/{target['event_id']}/book", book, True, 302, BOOKED),
+        ('main.booking_history', 'GET', '/booking-history', None, True, 200, None),
+    ]
+
+
+def build_database(db_path, args):
+    from website import db
+    from website.models import Genre
+    from website.schema import upgrade_schema
+    from website.seed import seed_database
+    app = make_app(db_path)
+    with app.app_context():
+        upgrade_schema()
+        db.session.add_all([Genre(name=name, image_filename=f'img/{name}.png') for name in GENRES])
+        db.session.commit()
+        seed_database(args.users, args.events, args.orders, args.comments, seed=args.seed, echo=lambda message: None)
+
+
+def find_target(db_path):
+    '''
+    the busiest open event with tickets left (and its roomiest ticket type, restocked),
+    and the user with the longest booking history
+    '''
+    from website import db
+    from website.models import User, Event, Booking, Genre, ticket_type
+    app = make_app(db_path)
+    with app.app_context():
+        event = db.session.scalars(
+            db.select(Event).where(Event.current_status == 'Open')
+            .order_by(Event.sold_count.desc()).limit(1)).first()
+        if event is None:
+            raise SystemExit("No open events in the database to benchmark.")
+        ticket = event.ticket_types.order_by(ticket_type.quantity_available.desc()).first()
+        user = db.session.get(User, db.session.scalar(
+            db.select(Booking.user_id).group_by(Booking.user_id)
+            .order_by(db.func.count().desc()).limit(1)))
+        genre = db.session.scalar(db.select(Genre.name).where(Genre.id == event.genre_id))
+        # Room for every booking the run makes: a sold out event redirects to its details
+        # page instead, which would time (and count as errors) something other than booking
+        ticket.quantity_available += RESTOCK
+        event.remaining_count += RESTOCK
+        db.session.commit()
+        return {'event_id': event.id, 'ticket_id': ticket.id, 'user_id': user.id, 'email': user.email,
+                'genre': genre, 'search': event.name.split()[0]}
+
+
+def succeeded(status, location, expected, redirects):
+    if status != expected:
+        return False
+    return redirects is None or any(fragment in (location or '') for fragment in redirects)
+
+
+def summarise(latencies, queries, errors, elapsed):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'per_second': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'queries': max(queries) if queries else None,
+    }
+
+
+# ===============================
+# TEST CLIENT
+# ===============================
+
+def run_client(db_path, target, requests, warmup):
+    app = make_app(db_path, **BENCH_CONFIG)
+    results = {}
+    for name, method, path, data, logged_in, expected, redirects in scenarios(target):
+        client = app.test_client()
+        if logged_in:
+            with client.session_transaction() as session:
+                session['_user_id'] = str(target['user_id'])
+                session['_fresh'] = True
+        latencies, queries, errors = [], [], 0
+        began = time.perf_counter()
+        for attempt in range(warmup + requests):
+            if attempt == warmup:
+                latencies, queries, errors = [], [], 0
+                began = time.perf_counter()
+            started = time.perf_counter()
+            response = client.open(path, method=method, data=data)
+            latencies.append(time.perf_counter() - started)
+            if not succeeded(response.status_code, response.headers.get('Location'), expected, redirects):
+                errors += 1
+            if 'X-Query-Count' in response.headers:
+                queries.append(int(response.headers['X-Query-Count']))
+        results[name] = summarise(latencies, queries, errors, time.perf_counter() - began)
+    return results
+
+
+# ===============================
+# HTTP LOAD
+# ===============================
+
+def serve(db_path, port_queue):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args):
+            pass
+
+    app = make_app(db_path, **BENCH_CONFIG)
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def login_cookie(port, email):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    connection.request('POST', '/login', body=urlencode({'email': email, 'password': 'password'}),
+                       headers={'Content-Type': 'application/x-www-form-urlencoded'})
+    response = connection.getresponse()
+    response.read()
+    cookie = response.getheader('Set-Cookie', '')
+    location = response.getheader('Location', '')
+    connection.close()
+    # A good login redirects away from the form; a failed one re-renders it (200) or sends it back
+    if response.status != 302 or '/login' in location or not cookie:
+        raise SystemExit(f"Logging in as {email} failed (status {response.status}, Location {location!r}); "
+                         "the logged-in routes can't be benchmarked.")
+    return cookie.split(';')[0]
+
+
+def http_worker(job):
+    port, method, path, data, cookie, expected, redirects, seconds = job
+    body = urlencode(data) if data else None
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body else {}
+    if cookie:
+        headers['Cookie'] = cookie
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    latencies, queries, errors = [], [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - started)
+        if not succeeded(response.status, response.getheader('Location'), expected, redirects):
+            errors += 1
+        if response.getheader('X-Query-Count'):
+            queries.append(int(response.getheader('X-Query-Count')))
+    connection.close()
+    return latencies, queries, errors
+
+
+def run_http(db_path, target, processes, seconds):
+    context = multiprocessing.get_context('spawn')
+    port_queue = context.Queue()
+    server = context.Process(target=serve, args=(db_path, port_queue), daemon=True)
+    server.start()
+    try:
+        port = port_queue.get(timeout=60)
+        cookie = login_cookie(port, target['email'])
+        results = {}
+        with context.Pool(processes) as pool:
+            for name, method, path, data, logged_in, expected, redirects in scenarios(target):
+                job = (port, method, path, data, cookie if logged_in else None, expected, redirects, seconds)
+                began = time.perf_counter()
+                outcomes = pool.map(http_worker, [job] * processes)
+                elapsed = time.perf_counter() - began
+                latencies = [latency for outcome in outcomes for latency in outcome[0]]
+                queries = [count for outcome in outcomes for count in outcome[1]]
+                results[name] = summarise(latencies, queries, sum(outcome[2] for outcome in outcomes), elapsed)
+        return results
+    finally:
+        server.terminate()
+        server.join()
+
+
+# ===============================
+# REPORTING
+# ===============================
+
+def report(mode, results, baseline, tolerance):
+    '''
+    print one mode's results, with the change from the baseline when there is one;
+    returns the regressions found
+    '''
+    regressions = []
+    print(f"\n{mode}")
+    print(f"{'route':<26} {'reqs':>6} {'err':>4} {'per sec':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+    for name, result in results.items():
+        print(f"{name:<26} {result['requests']:>6} {result['errors']:>4} {result['per_second']:>9.1f} "
+              f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['queries']!s:>8}")
+        before = baseline.get(name)
+        if before is None:
+            continue
+        changes = []
+        if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            changes.append(f"p95 {before['p95_ms']:.2f} -> {result['p95_ms']:.2f} ms")
+        if result['per_second'] < before['per_second'] * (1 - tolerance):
+            changes.append(f"throughput {before['per_second']:.1f} -> {result['per_second']:.1f}/s")
+        if None not in (result['queries'], before['queries']) and result['queries'] > before['queries']:
+            changes.append(f"queries {before['queries']} -> {result['queries']}")
+        if result['errors'] > before['errors']:
+            changes.append(f"errors {before['errors']} -> {result['errors']}")
+        if changes:
+            regressions.append(f"{mode} {name}: {', '.join(changes)}")
+            print(f"{'':<26} REGRESSION: {', '.join(changes)}")
+        else:
+            print(f"{'':<26} vs baseline: p95 {result['p95_ms'] / before['p95_ms'] - 1:+.0%}, "
+                  f"throughput {result['per_second'] / before['per_second'] - 1:+.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='copy this (seeded) SQLite file instead of generating one')
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--events', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--comments', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mode', choices=['client', 'http', 'both'], default='both')
+    parser.add_argument('--requests', type=int, default=200, help='timed test client requests per route')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed test client requests per route')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 4, help='HTTP load processes')
+    parser.add_argument('--seconds', type=float, default=5, help='HTTP load duration per route')
+    parser.add_argument('--save', metavar='PATH', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare against a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='allowed p95/throughput change before a route counts as regressed')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'routes.sqlite')
+        if args.database:
+            shutil.copyfile(args.database, db_path)
+        else:
+            print("Seeding the benchmark database...")
+            build_database(db_path, args)
+        target = find_target(db_path)
+        results = {}
+        if args.mode in ('client', 'both'):
+            results['client'] = run_client(db_path, target, args.requests, args.warmup)
+        if args.mode in ('http', 'both'):
+            results['http'] = run_http(db_path, target, args.processes, args.seconds)
+
+    regressions = []
+    for mode, mode_results in results.items():
+        regressions.extend(report(mode, mode_results, baseline.get(mode, {}), args.tolerance))
+
+    if args.save:
+        settings = {key: getattr(args, key) for key in
+                    ('database', 'users', 'events', 'orders', 'comments', 'seed', 'requests', 'processes', 'seconds')}
+        with open(args.save, 'w') as baseline_file:
+            json.dump({'created': datetime.now().isoformat(timespec='seconds'), 'settings': settings,
+                       'results': results}, baseline_file, indent=2)
+        print(f"\nBaseline saved to {args.save}")
+    if regressions:
+        print(f"\n{len(regressions)} regressions against {args.compare}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,19 @@
 from website import db, create_app
 from website.models import Genre
+from website.schema import upgrade_schema
+from website.counters import rebuild_ticket_counters
+from website.sales import rebuild_sales_daily
 
 # Create the Flask app and push the context to allow database operations
 app = create_app()
 ctx = app.app_context()
 ctx.push()
-# Create all database tables based on the defined models
-db.create_all()
+# Create all database tables based on the defined models, adding any new columns to an existing database
+upgrade_schema()
+# Fill the sold/remaining ticket counters from the bookings already stored
+rebuild_ticket_counters()
+# Fill the daily sales rollup from the bookings already stored
+rebuild_sales_daily()
 
 def add_sample_genres():
     """Add the predefined genres to the database"""
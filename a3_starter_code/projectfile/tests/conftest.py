@@ -0,0 +1,57 @@
+'''
+Shared fixtures: an app on a throwaway SQLite file (a file, not :memory:, so
+several sessions and threads see the same database) with fast password hashing.
+
+Run from the projectfile directory:
+    python -m pytest -q
+'''
+from datetime import datetime, timedelta
+import pytest
+from website import create_app, db
+from website.models import User, Genre, Event, ticket_type
+from website.schema import upgrade_schema
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.sqlite'}",
+        'WTF_CSRF_ENABLED': False,
+        'BCRYPT_LOG_ROUNDS': 4,
+        'PASSWORD_HASH_WORKERS': 0,
+        'TESTING': True,
+    })
+    with app.app_context():
+        upgrade_schema()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def make_event(app):
+    '''
+    make_event(capacity) -> (event id, ticket type id, [user ids]) for an upcoming
+    event with one ticket type of that capacity and two buyers
+    '''
+    def make_event(capacity, buyers=2):
+        with app.app_context():
+            genre = Genre(name='Test')
+            creator = User(firstName='Test', surname='Creator', email='creator@example.com',
+                           mobileNumber='0400000000', streetAddress='1 Test Street', password_hash='x')
+            db.session.add_all([genre, creator])
+            db.session.flush()
+            users = [User(firstName='Buyer', surname=str(i), email=f'buyer{i}@example.com',
+                          mobileNumber=f'04{i:08d}', streetAddress='1 Test Street', password_hash='x')
+                     for i in range(1, buyers + 1)]
+            event = Event(name='Test Event', start_datetime=datetime.now() + timedelta(days=30),
+                          location='Brisbane', genre_id=genre.id, created_by=creator.id,
+                          remaining_count=capacity)
+            db.session.add_all(users + [event])
+            db.session.flush()
+            ticket = ticket_type(event_id=event.id, type_name='General Admission', price=50.0,
+                                 quantity_available=capacity)
+            db.session.add(ticket)
+            db.session.commit()
+            return event.id, ticket.id, [user.id for user in users]
+    return make_event
@@ -0,0 +1,40 @@
+'''
+The group-commit booking writer: a caller that times out must not have its
+order committed afterwards, and one whose batch has started gets its outcome.
+'''
+import threading
+import time
+import pytest
+from website import db
+from website.models import Booking
+from website.booking_writer import BookingWriter
+
+
+def cart(ticket_id, quantity):
+    return [{'ticket_type_id': ticket_id, 'ticket_type_name': 'General Admission',
+             'price': 50, 'quantity': quantity, 'subtotal': 50 * quantity}]
+
+
+def test_timed_out_order_is_not_committed_later(app, make_event):
+    event_id, ticket_id, (first, second) = make_event(capacity=5)
+    writer = BookingWriter(app, batch_size=1, max_wait=0)
+    with app.app_context():
+        # Hold the write lock so the writer's first batch waits in BEGIN IMMEDIATE
+        blocker = db.engine.raw_connection()
+        blocker.execute('BEGIN IMMEDIATE')
+        results = {}
+        started = threading.Thread(target=lambda: results.setdefault(
+            'first', writer.submit(first, event_id, cart(ticket_id, 1), timeout=0.2)))
+        started.start()
+        time.sleep(0.1)
+        # Queued behind the stuck batch: gives up and is withdrawn
+        with pytest.raises(TimeoutError):
+            writer.submit(second, event_id, cart(ticket_id, 2), timeout=0.3)
+        blocker.rollback()
+        blocker.close()
+        started.join()
+        writer.stop()
+        # The first caller waited past its timeout for the batch it was already in
+        assert results['first'] is not None
+        bookings = db.session.execute(db.select(Booking.user_id, Booking.quantity)).all()
+        assert bookings == [(first, 1)]
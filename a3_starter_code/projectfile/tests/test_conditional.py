@@ -0,0 +1,54 @@
+'''
+Conditional GETs: a 304 must only be sent when the page would render the same.
+'''
+import time
+import pytest
+from website import db, images
+from website.models import Comment, Event, User
+
+
+def test_details_etag_changes_when_a_commenter_renames(app, make_event):
+    event_id, _, (buyer, _) = make_event(capacity=10)
+    with app.app_context():
+        db.session.add(Comment(event_id=event_id, user_id=buyer, text='Great lineup'))
+        db.session.commit()
+    client = app.test_client()
+    first = client.get(f'/events/{event_id}')
+    assert first.status_code == 200 and first.headers.get('ETag')
+    assert client.get(f'/events/{event_id}', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    with app.app_context():
+        db.session.get(User, buyer).firstName = 'Renamed'
+        db.session.commit()
+    second = client.get(f'/events/{event_id}', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200 and 'Renamed' in second.get_data(as_text=True)
+
+
+def test_etags_change_when_an_events_image_gets_variants(app, make_event, tmp_path):
+    PIL = pytest.importorskip('PIL.Image')
+    event_id, _, _ = make_event(capacity=10)
+    app.static_folder = str(tmp_path / 'static')
+    images._manifests.clear()
+    images._missing.clear()
+    (tmp_path / 'static' / 'img' / 'events').mkdir(parents=True)
+    PIL.new('RGB', (1200, 600), 'red').save(tmp_path / 'static' / 'img' / 'events' / 'poster.png')
+    with app.app_context():
+        db.session.get(Event, event_id).image_filename = 'img/events/poster.png'
+        db.session.commit()
+    client = app.test_client()
+    pages = [f'/events/{event_id}', '/events/eventspage']
+    etags = {}
+    for page in pages:
+        first = client.get(page)
+        assert first.status_code == 200 and 'srcset' not in first.get_data(as_text=True)
+        etags[page] = first.headers['ETag']
+
+    images.make_variants(app, 'img/events/poster.png')
+    # Another process made them: this one only has its cached miss
+    images._manifests.clear()
+    images._missing['img/events/poster.png'] = time.monotonic()
+    for page in pages:
+        response = client.get(page, headers={'If-None-Match': etags[page]})
+        assert response.status_code == 200 and 'srcset' in response.get_data(as_text=True), page
+    images._manifests.clear()
+    images._missing.clear()
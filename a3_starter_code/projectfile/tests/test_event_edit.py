@@ -0,0 +1,97 @@
+'''
+Capacity edits on /events/<id>/edit apply their change relative to the current
+ticket counts, so bookings made while the organiser was editing are kept, and
+count tickets held at checkout as part of the total.
+'''
+from datetime import datetime, timedelta
+from website import db, events
+from website.models import Event, ticket_type, User, TicketHold
+from website.inventory import place_order
+from website.counters import check_ticket_counters
+from test_inventory import hold
+
+
+def edit_form(total):
+    return {'name': 'Edited Event', 'start_datetime': (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%dT%H:%M'),
+            'location': 'Brisbane', 'genre': '1', 'general_price': '50', 'general_quantity': str(total)}
+
+
+def organiser_client(app):
+    client = app.test_client()
+    with app.app_context():
+        creator_id = db.session.scalar(db.select(User.id).where(User.email == 'creator@example.com'))
+    with client.session_transaction() as session:
+        session['_user_id'] = str(creator_id)
+        session['_fresh'] = True
+    return client
+
+
+def sell_first(monkeypatch, buyer, quantity):
+    # A booking that commits after the edit handler read the ticket counts
+    restock = events.restock_tickets
+
+    def booked_meanwhile(event_id, ticket_type_id, delta, type_name):
+        place_order(buyer, db.session.get(Event, event_id),
+                    [{'ticket_type_id': ticket_type_id, 'ticket_type_name': type_name,
+                      'price': 50, 'quantity': quantity, 'subtotal': 50 * quantity}])
+        restock(event_id, ticket_type_id, delta, type_name)
+
+    monkeypatch.setattr(events, 'restock_tickets', booked_meanwhile)
+
+
+def test_raising_capacity_keeps_tickets_sold_meanwhile(app, make_event, monkeypatch):
+    event_id, ticket_id, (buyer, _) = make_event(capacity=10)
+    sell_first(monkeypatch, buyer, 3)
+    response = organiser_client(app).post(f'/events/{event_id}/edit', data=edit_form(12))
+    assert response.status_code == 302
+    with app.app_context():
+        ticket = db.session.get(ticket_type, ticket_id)
+        assert (ticket.sold_count, ticket.quantity_available) == (3, 9)
+        assert db.session.get(Event, event_id).remaining_count == 9
+        assert check_ticket_counters() == []
+
+
+def test_cutting_capacity_below_what_was_sold_meanwhile_is_a_conflict(app, make_event, monkeypatch):
+    event_id, ticket_id, (buyer, _) = make_event(capacity=5)
+    sell_first(monkeypatch, buyer, 4)
+    response = organiser_client(app).post(f'/events/{event_id}/edit', data=edit_form(2))
+    assert response.status_code == 200
+    assert b'booked while you were editing' in response.data
+    with app.app_context():
+        event = db.session.get(Event, event_id)
+        assert event.name == 'Test Event'
+        assert db.session.get(ticket_type, ticket_id).quantity_available == 5
+        assert check_ticket_counters() == []
+
+
+def test_tickets_held_at_checkout_count_towards_the_total(app, make_event):
+    event_id, ticket_id, (buyer, _) = make_event(capacity=10)
+    with app.app_context():
+        hold(buyer, event_id, ticket_id, 3)
+    client = organiser_client(app)
+    page = client.get(f'/events/{event_id}/edit')
+    assert b'value="10"' in page.data and b'3 reserved at checkout' in page.data
+    # Saving the total unchanged leaves the held tickets out of inventory
+    assert client.post(f'/events/{event_id}/edit', data=edit_form(10)).status_code == 302
+    with app.app_context():
+        assert db.session.get(ticket_type, ticket_id).quantity_available == 7
+        assert db.session.get(Event, event_id).remaining_count == 7
+    assert client.post(f'/events/{event_id}/edit', data=edit_form(2)).status_code == 200
+
+
+def test_details_page_treats_lapsed_holds_as_on_sale(app, make_event):
+    event_id, ticket_id, (buyer, other) = make_event(capacity=2)
+    with app.app_context():
+        hold_ids = hold(buyer, event_id, ticket_id, 2)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(other)
+    assert b'All Tickets Reserved' in client.get(f'/events/{event_id}').data
+    with app.app_context():
+        # Expired, but not swept back into inventory yet
+        db.session.execute(db.update(TicketHold).where(TicketHold.id.in_(hold_ids))
+                           .values(expires_at=datetime.now() - timedelta(seconds=1)))
+        db.session.commit()
+    page = client.get(f'/events/{event_id}').data
+    assert b'All Tickets Reserved' not in page and b'Sold Out' not in page
+    assert b'Book Tickets' in page
@@ -0,0 +1,61 @@
+'''
+Incremental attendee manifest pulls (?since=) must not lose bookings that were
+stamped before a pull but committed after it.
+'''
+import csv
+import io
+from datetime import datetime, timedelta, timezone
+from website import db
+from website.models import Booking, Event, User
+from website.inventory import place_order
+
+
+def book(event_id, ticket_id, user_id, stamped):
+    order = place_order(user_id, db.session.get(Event, event_id),
+                        [{'ticket_type_id': ticket_id, 'ticket_type_name': 'General Admission',
+                          'price': 50, 'quantity': 1, 'subtotal': 50}])
+    db.session.flush()
+    db.session.execute(db.update(Booking).where(Booking.order_id == order.id).values(updated_at=stamped))
+    db.session.commit()
+    return db.session.scalar(db.select(Booking.id).where(Booking.order_id == order.id))
+
+
+def pull(client, event_id, since=None):
+    response = client.get(f'/events/{event_id}/attendees.csv', query_string={'since': since} if since else None)
+    assert response.status_code == 200, response.status_code
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    return {int(row['booking_id']) for row in rows}, response.headers['X-Manifest-As-Of']
+
+
+def test_increment_includes_late_commits_and_shared_timestamps(app, make_event):
+    event_id, ticket_id, (buyer, other) = make_event(capacity=10)
+    client = app.test_client()
+    with app.app_context():
+        creator = db.session.scalar(db.select(User.id).where(User.email == 'creator@example.com'))
+        earlier = book(event_id, ticket_id, buyer, datetime.now() - timedelta(minutes=5))
+    with client.session_transaction() as session:
+        session['_user_id'] = str(creator)
+
+    seen, as_of = pull(client, event_id)
+    assert seen == {earlier}
+
+    with app.app_context():
+        # Stamped before the pull above, committed only now (e.g. waiting on the write lock)
+        late = book(event_id, ticket_id, other, datetime.fromisoformat(as_of) - timedelta(seconds=2))
+    seen, _ = pull(client, event_id, since=as_of)
+    assert late in seen and earlier not in seen
+
+
+def test_since_with_a_time_zone_is_converted_to_server_time(app, make_event):
+    event_id, ticket_id, (buyer, _) = make_event(capacity=10)
+    client = app.test_client()
+    with app.app_context():
+        creator = db.session.scalar(db.select(User.id).where(User.email == 'creator@example.com'))
+        recent = book(event_id, ticket_id, buyer, datetime.now())
+    with client.session_transaction() as session:
+        session['_user_id'] = str(creator)
+    an_hour_ago = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat().replace('+00:00', 'Z')
+    an_hour_ahead = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat().replace('+00:00', 'Z')
+    assert pull(client, event_id, since=an_hour_ago)[0] == {recent}
+    assert pull(client, event_id, since=an_hour_ahead)[0] == set()
+    assert client.get(f'/events/{event_id}/attendees.csv?since=yesterday').status_code == 400
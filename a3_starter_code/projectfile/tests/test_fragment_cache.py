@@ -0,0 +1,40 @@
+'''
+Cached event cards must change when anything they show changes, including
+things outside the event row (the genre name, the image variants).
+'''
+import pytest
+from website import db, images
+from website.models import Event, Genre
+
+PIL = pytest.importorskip('PIL.Image')
+
+
+def test_event_card_follows_genre_and_image_variants(app, make_event, tmp_path):
+    app.static_folder = str(tmp_path / 'static')
+    images._manifests.clear()
+    images._missing.clear()
+    poster = tmp_path / 'static' / 'img' / 'events' / 'poster.png'
+    poster.parent.mkdir(parents=True)
+    PIL.new('RGB', (1200, 600), 'red').save(poster)
+    event_id, _, _ = make_event(capacity=10)
+    with app.app_context():
+        db.session.get(Event, event_id).image_filename = 'img/events/poster.png'
+        db.session.commit()
+    client = app.test_client()
+
+    page = client.get('/events/eventspage').get_data(as_text=True)
+    assert 'Test' in page and 'srcset' not in page
+
+    # Renaming the genre doesn't touch events.updated_at
+    with app.app_context():
+        db.session.scalar(db.select(Genre)).name = 'Renamed Genre'
+        db.session.commit()
+    page = client.get('/events/eventspage').get_data(as_text=True)
+    assert 'Renamed Genre' in page
+
+    # Variants made after the card was cached (as by flask process-images)
+    images.make_variants(app, 'img/events/poster.png')
+    page = client.get('/events/eventspage').get_data(as_text=True)
+    assert 'srcset' in page and 'poster.png-card.webp' in page
+    images._manifests.clear()
+    images._missing.clear()
@@ -0,0 +1,57 @@
+'''
+Variant naming and manifest caching in website/images.py.
+'''
+import json
+import os
+import pytest
+from website import images
+
+PIL = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture
+def static_dir(app, tmp_path):
+    # Keep generated files out of the real static folder, and start with empty caches
+    app.static_folder = str(tmp_path / 'static')
+    images._manifests.clear()
+    images._missing.clear()
+    yield tmp_path / 'static'
+    images._manifests.clear()
+    images._missing.clear()
+
+
+def save_image(static_dir, relative, width):
+    path = static_dir / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    PIL.new('RGB', (width, width // 2), 'red').save(path)
+
+
+def test_same_file_name_in_two_folders_gets_separate_variants(app, static_dir):
+    save_image(static_dir, 'img/events/poster.png', 1000)
+    save_image(static_dir, 'img/archive/poster.png', 600)
+    with app.test_request_context():
+        first = images.make_variants(app, 'img/events/poster.png')
+        second = images.make_variants(app, 'img/archive/poster.png')
+        assert first['width'] == 1000 and second['width'] == 600
+        assert images.image_manifest('img/events/poster.png') == first
+        assert images.image_manifest('img/archive/poster.png') == second
+        assert images.event_image_attrs('img/events/poster.png') != images.event_image_attrs('img/archive/poster.png')
+    for relative in ('img/events/poster.png', 'img/archive/poster.png'):
+        assert os.path.exists(static_dir / images.VARIANT_DIR / f'{relative}-card.webp')
+
+
+def test_missing_manifest_is_cached_until_variants_are_made(app, static_dir):
+    save_image(static_dir, 'img/Rock.png', 800)
+    with app.test_request_context():
+        assert images.image_manifest('img/Rock.png') is None
+        # Written behind the cache's back (as another process would): not looked for yet
+        manifest_path = static_dir / images.VARIANT_DIR / 'img/Rock.png.json'
+        manifest_path.parent.mkdir(parents=True)
+        manifest_path.write_text(json.dumps({'width': 800, 'variants': {}}))
+        assert images.image_manifest('img/Rock.png') is None
+        # ...but it is once the recheck interval has passed
+        images._missing['img/Rock.png'] -= images.MANIFEST_RECHECK_SECONDS
+        assert images.image_manifest('img/Rock.png') == {'width': 800, 'variants': {}}
+        # make_variants in this process replaces the entry straight away
+        manifest = images.make_variants(app, 'img/Rock.png')
+        assert manifest['variants'] and images.image_manifest('img/Rock.png') == manifest
@@ -0,0 +1,120 @@
+'''
+The race-safety invariants of website/inventory.py: the conditional UPDATE in
+claim_tickets never oversells, and a hold is turned into a booking or swept back
+into inventory, never both.
+'''
+import threading
+from datetime import datetime, timedelta
+import pytest
+from website import db
+from website.models import Event, ticket_type, TicketHold, Booking
+from website.inventory import (place_order, place_holds, release_expired_holds,
+                               InsufficientTickets, HoldExpired)
+from website.counters import check_ticket_counters
+
+
+def cart(ticket_id, quantity):
+    return [{'ticket_type_id': ticket_id, 'ticket_type_name': 'General Admission',
+             'price': 50, 'quantity': quantity, 'subtotal': 50 * quantity}]
+
+
+def sold_and_left(ticket_id):
+    ticket = db.session.get(ticket_type, ticket_id)
+    return ticket.sold_count, ticket.quantity_available
+
+
+def test_stale_session_cannot_take_the_last_tickets(app, make_event):
+    event_id, ticket_id, (first, second) = make_event(capacity=2)
+    with app.app_context():
+        # Both sessions have seen 2 tickets left before either books
+        stale = db.session.get(Event, event_id)
+        assert db.session.get(ticket_type, ticket_id).quantity_available == 2
+        with app.app_context():
+            place_order(first, db.session.get(Event, event_id), cart(ticket_id, 2))
+            db.session.commit()
+        with pytest.raises(InsufficientTickets):
+            place_order(second, stale, cart(ticket_id, 1))
+        db.session.rollback()
+        assert sold_and_left(ticket_id) == (2, 0)
+        assert check_ticket_counters() == []
+
+
+def test_concurrent_bookings_never_oversell(app, make_event):
+    capacity, buyers = 5, 8
+    event_id, ticket_id, users = make_event(capacity=capacity, buyers=buyers)
+    start = threading.Barrier(buyers)
+    outcomes = []
+
+    def book(user_id):
+        with app.app_context():
+            event = db.session.get(Event, event_id)
+            start.wait()
+            try:
+                place_order(user_id, event, cart(ticket_id, 1))
+                db.session.commit()
+                outcomes.append('booked')
+            except InsufficientTickets:
+                db.session.rollback()
+                outcomes.append('rejected')
+
+    threads = [threading.Thread(target=book, args=(user_id,)) for user_id in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert outcomes.count('booked') == capacity
+    assert outcomes.count('rejected') == buyers - capacity
+    with app.app_context():
+        assert sold_and_left(ticket_id) == (capacity, 0)
+        assert db.session.scalar(db.select(db.func.sum(Booking.quantity))) == capacity
+        assert check_ticket_counters() == []
+
+
+def hold(user_id, event_id, ticket_id, quantity, expired=False):
+    hold_ids, _ = place_holds(user_id, db.session.get(Event, event_id), cart(ticket_id, quantity))
+    if expired:
+        db.session.execute(db.update(TicketHold).where(TicketHold.id.in_(hold_ids))
+                           .values(expires_at=datetime.now() - timedelta(seconds=1)))
+    db.session.commit()
+    return hold_ids
+
+
+def test_expired_hold_cannot_be_consumed(app, make_event):
+    event_id, ticket_id, (buyer, _) = make_event(capacity=3)
+    with app.app_context():
+        hold_ids = hold(buyer, event_id, ticket_id, 2, expired=True)
+        assert sold_and_left(ticket_id) == (0, 1)
+        with pytest.raises(HoldExpired):
+            place_order(buyer, db.session.get(Event, event_id), cart(ticket_id, 2), hold_ids=hold_ids)
+        db.session.rollback()
+        # The hold is still there for the sweeper, which puts the tickets back
+        assert release_expired_holds() == 1
+        assert sold_and_left(ticket_id) == (0, 3)
+        assert check_ticket_counters() == []
+
+
+def test_swept_hold_is_not_sold_as_well(app, make_event):
+    event_id, ticket_id, (buyer, _) = make_event(capacity=3)
+    with app.app_context():
+        hold_ids = hold(buyer, event_id, ticket_id, 2, expired=True)
+        assert release_expired_holds() == 1
+        with pytest.raises(HoldExpired):
+            place_order(buyer, db.session.get(Event, event_id), cart(ticket_id, 2), hold_ids=hold_ids)
+        db.session.rollback()
+        assert sold_and_left(ticket_id) == (0, 3)
+        assert db.session.scalar(db.select(db.func.count(Booking.id))) == 0
+        assert check_ticket_counters() == []
+
+
+def test_sweeper_leaves_unexpired_holds_to_checkout(app, make_event):
+    event_id, ticket_id, (buyer, other) = make_event(capacity=3)
+    with app.app_context():
+        hold_ids = hold(buyer, event_id, ticket_id, 2)
+        hold(other, event_id, ticket_id, 1, expired=True)
+        assert release_expired_holds(event_id=event_id) == 1
+        place_order(buyer, db.session.get(Event, event_id), cart(ticket_id, 2), hold_ids=hold_ids)
+        db.session.commit()
+        assert sold_and_left(ticket_id) == (2, 1)
+        assert db.session.scalar(db.select(db.func.count(TicketHold.id))) == 0
+        assert check_ticket_counters() == []
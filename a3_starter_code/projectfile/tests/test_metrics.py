@@ -0,0 +1,20 @@
+'''
+Per-request SQL timing in website/metrics.py.
+'''
+import pytest
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from website import db
+
+
+def test_failed_statement_leaves_no_start_time_behind(app):
+    with app.test_request_context():
+        app.preprocess_request()
+        with db.engine.connect() as connection:
+            with pytest.raises(OperationalError):
+                connection.execute(text('SELECT * FROM no_such_table'))
+            assert not connection.connection.info.get('metrics_query_start')
+            connection.execute(text('SELECT 1'))
+            assert not connection.connection.info.get('metrics_query_start')
+        assert g.metrics_sql_count == 1
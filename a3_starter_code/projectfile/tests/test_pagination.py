@@ -0,0 +1,21 @@
+'''
+Keyset cursors come from the query string, so crafted ones must not reach the database.
+'''
+import base64
+import json
+import pytest
+
+
+def cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('values', [[[1], 2], [{'dt': 'soon'}, 2], ['a', 'b'], [True, 1], [1]])
+def test_cursor_that_does_not_fit_the_sort_columns_is_ignored(app, make_event, values):
+    make_event(capacity=10)
+    client = app.test_client()
+    for path in ('/api/v1/events', '/events/eventspage'):
+        response = client.get(path, query_string={'after': cursor(values)})
+        assert response.status_code == 200, path
+    assert len(client.get('/api/v1/events', query_string={'before': cursor(values)}).get_json()['data']) == 1
+
@@ -0,0 +1,77 @@
+'''
+Password checks through website/passwords.py, including hashes left by Flask-Bcrypt.
+'''
+import pytest
+from website import db
+from website.models import User
+from website.passwords import check_password, hash_password, needs_rehash
+
+
+def add_user(password_hash):
+    user = User(firstName='Old', surname='Hash', email='old@example.com', mobileNumber='0400999000',
+                streetAddress='1 Test Street', password_hash=password_hash)
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def test_login_with_a_flask_bcrypt_bytes_hash_upgrades_it_to_text(app):
+    flask_bcrypt = pytest.importorskip('flask_bcrypt')
+    with app.app_context():
+        # Flask-Bcrypt's generate_password_hash returns bytes, stored as a BLOB
+        legacy = flask_bcrypt.generate_password_hash('Passw0rd!', rounds=4)
+        assert isinstance(legacy, bytes)
+        user_id = add_user(legacy)
+        assert check_password(db.session.get(User, user_id).password_hash, 'Passw0rd!')
+        assert not check_password(db.session.get(User, user_id).password_hash, 'wrong')
+        assert needs_rehash(legacy)
+
+    client = app.test_client()
+    assert client.post('/login', data={'email': 'old@example.com', 'password': 'wrong'}).status_code == 200
+    assert client.post('/login', data={'email': 'old@example.com', 'password': 'Passw0rd!'}).status_code == 302
+    with app.app_context():
+        stored = db.session.get(User, user_id).password_hash
+        assert isinstance(stored, str) and stored.startswith('$2b$04$')
+        assert check_password(stored, 'Passw0rd!')
+
+
+def test_outdated_cost_is_rehashed_at_login(app):
+    with app.app_context():
+        app.config['BCRYPT_LOG_ROUNDS'] = 5
+        user_id = add_user(hash_password('Passw0rd!'))
+        app.config['BCRYPT_LOG_ROUNDS'] = 4
+    client = app.test_client()
+    assert client.post('/login', data={'email': 'old@example.com', 'password': 'Passw0rd!'}).status_code == 302
+    with app.app_context():
+        assert db.session.get(User, user_id).password_hash.startswith('$2b$04$')
+
+
+def test_login_hashes_inline_when_the_pool_cannot_start(app, monkeypatch):
+    from website import passwords
+
+    def no_children(workers):
+        raise AssertionError('daemonic processes are not allowed to have children')
+
+    monkeypatch.setattr(passwords, '_executor', no_children)
+    monkeypatch.setattr(passwords, '_pool_unavailable', False)
+    app.config['PASSWORD_HASH_WORKERS'] = 2
+    with app.app_context():
+        add_user(hash_password('Passw0rd!'))
+    client = app.test_client()
+    assert client.post('/login', data={'email': 'old@example.com', 'password': 'Passw0rd!'}).status_code == 302
+    assert passwords._pool_unavailable
+    assert client.post('/login', data={'email': 'old@example.com', 'password': 'wrong'}).status_code == 200
+
+
+def test_register_rejects_passwords_over_bcrypts_72_bytes(app):
+    password = 'Passw0rd!' + 'x' * 91
+    form = {'firstName': 'Long', 'surname': 'Password', 'email': 'long@example.com',
+            'mobileNumber': '0400123456', 'streetAddress': '1 Test Street',
+            'password': password, 'confirm': password}
+    response = app.test_client().post('/register', data=form)
+    assert response.status_code == 200
+    assert b'at most 72 bytes' in response.data
+    with app.app_context():
+        assert db.session.scalar(db.select(User).where(User.email == 'long@example.com')) is None
+    form['password'] = form['confirm'] = 'Passw0rd!' + 'x' * 63
+    assert app.test_client().post('/register', data=form).status_code == 302
@@ -3,25 +3,61 @@ from flask import Flask
 from flask_bootstrap import Bootstrap5
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from .config import Config
+from .engine import engine_options, configure_engine
+from .routing import RoutingSession
 
-db = SQLAlchemy()
+# RoutingSession sends the queries of @read_only views to the read engine
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # create a function that creates a web application
 # a web server will run this web application
-def create_app():
+def create_app(config=None):
     '''
     create a web application
+    config: optional dict of settings that override the defaults below (used by scripts and benchmarks)
     '''
     app = Flask(__name__)  # this is the name of the module/package that is calling this app
     # Should be set to false in a production environment
     app.debug = True
-    app.secret_key = 'somesecretkey'
-    # set the app configuration data 
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///sitedata.sqlite'
+    # set the app configuration data from config.py (environment variables override the defaults there)
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
     # initialise db with flask app
     db.init_app(app)
+    with app.app_context():
+        configure_engine(db.engine, app.config)
+    from . import routing
+    routing.init_app(app, db)
+    with app.app_context():
+        engines = [db.engine]
+    if 'read_engine' in app.extensions:
+        engines.append(app.extensions['read_engine'])
+    # per-endpoint request metrics at /metrics
+    if app.config['METRICS_ENABLED']:
+        from . import metrics
+        metrics.init_app(app, engines)
+    # N+1 query detector and query budgets, for development and test runs
+    if app.config['QUERY_AUDIT']:
+        from . import query_audit
+        query_audit.init_app(app, engines)
 
     Bootstrap5(app)
+
+    # templates render uploaded event images with a srcset of their resized variants
+    # (image_version goes in the {% cache %} keys of blocks that use it)
+    from .images import event_image_attrs, image_version
+    app.jinja_env.globals['event_image_attrs'] = event_image_attrs
+    app.jinja_env.globals['image_version'] = image_version
+    # {% cache %} tag for the event cards, see fragment_cache.py
+    from . import fragment_cache
+    fragment_cache.init_app(app)
+
+    # serve the fingerprinted static files made by `flask build-static`, if built
+    from . import assets
+    assets.init_app(app)
     
     # initialise the login manager
     login_manager = LoginManager()
@@ -33,10 +69,10 @@ def create_app():
 
     # create a user loader function takes userid and returns User
     # Importing inside the create_app function avoids circular references
-    from .models import User
-    @login_manager.user_loader
-    def load_user(user_id):
-       return db.session.scalar(db.select(User).where(User.id==user_id))
+    # (cached per process for USER_CACHE_TTL seconds, see user_cache.py)
+    from . import user_cache
+    user_cache.init_app(app)
+    login_manager.user_loader(user_cache.load_user)
 
     from . import views
     app.register_blueprint(views.main_bp)
@@ -46,7 +82,13 @@ def create_app():
 
     from . import events
     app.register_blueprint(events.eventbp)
-    
+
+    from . import api
+    app.register_blueprint(api.api_bp)
+
+    from . import commands
+    app.register_blueprint(commands.commands_bp)
+
     # Register error handlers
     from flask import render_template
     
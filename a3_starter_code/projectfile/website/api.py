@@ -0,0 +1,219 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from flask import Blueprint, Response, abort, request, url_for
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, load_only, raiseload
+from werkzeug.exceptions import HTTPException
+from .models import Event, Genre, ticket_type
+from .pagination import keyset_paginate
+from .routing import read_only
+from .events import filter_events
+from . import db
+
+# Read-only JSON API for partners and the mobile app, versioned in the URL
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Page size when ?limit= is not given, and the most one page may hold
+DEFAULT_LIMIT = 24
+MAX_LIMIT = 100
+
+
+def _orjson():
+    # orjson is optional: without it responses are encoded with the json module
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson
+
+
+_fast_json = _orjson()
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def json_response(data, status=200):
+    if _fast_json is not None:
+        body = _fast_json.dumps(data, default=_default)
+    else:
+        body = json.dumps(data, default=_default, separators=(',', ':'))
+    return Response(body, status=status, mimetype='application/json')
+
+
+@api_bp.errorhandler(HTTPException)
+def api_error(error):
+    return json_response({'error': {'status': error.code, 'message': error.description}}, error.code)
+
+
+# Handlers registered for a status code win over class-wide ones, so the app's HTML 404 page needs overriding too
+api_bp.register_error_handler(404, api_error)
+
+
+def _image_url(event):
+    if not event.image_filename:
+        return None
+    if event.image_filename.startswith('http'):
+        return event.image_filename
+    return url_for('static', filename=event.image_filename, _external=True)
+
+
+# Every field an event can have in a response: (columns it reads, how to get it).
+# Only the columns of the requested fields are loaded
+EVENT_FIELDS = {
+    'id': ([Event.id], lambda event: event.id),
+    'name': ([Event.name], lambda event: event.name),
+    'description': ([Event.description], lambda event: event.description),
+    'start_datetime': ([Event.start_datetime], lambda event: event.start_datetime),
+    'location': ([Event.location], lambda event: event.location),
+    'venue': ([Event.venue], lambda event: event.venue),
+    'artist_info': ([Event.artist_info], lambda event: event.artist_info),
+    'genre': ([Event.genre_id], lambda event: event.genre_info.name),
+    'status': ([Event.status, Event.start_datetime, Event.remaining_count], lambda event: event.current_status),
+    'sold_count': ([Event.sold_count], lambda event: event.sold_count),
+    'remaining_count': ([Event.remaining_count], lambda event: event.remaining_count),
+    'age_limit': ([Event.age_limit], lambda event: event.age_limit),
+    'length': ([Event.length], lambda event: event.length),
+    'policies': ([Event.policies], lambda event: event.policies),
+    'image_url': ([Event.image_filename], _image_url),
+    'url': ([], lambda event: url_for('event.details', id=event.id, _external=True)),
+    'created_at': ([Event.created_at], lambda event: event.created_at),
+    'updated_at': ([Event.updated_at], lambda event: event.updated_at),
+    # Filled in from one query for the whole page (see _ticket_types)
+    'ticket_types': ([], None),
+}
+DEFAULT_EVENT_FIELDS = ['id', 'name', 'start_datetime', 'location', 'venue', 'genre', 'status',
+                        'remaining_count', 'image_url', 'url']
+TICKET_FIELDS = ['id', 'type_name', 'description', 'price', 'remaining_count', 'sold_count']
+
+
+def requested_fields():
+    '''
+    the event fields named in ?fields=a,b,c (sparse fieldsets), or the defaults
+    '''
+    fields = [name.strip() for name in request.args.get('fields', '').split(',') if name.strip()]
+    if not fields:
+        return DEFAULT_EVENT_FIELDS
+    unknown = [name for name in fields if name not in EVENT_FIELDS]
+    if unknown:
+        abort(400, f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(EVENT_FIELDS)}")
+    return fields
+
+
+def event_query(fields):
+    '''
+    an Event query that loads only the columns (and the genre only when) the fields
+    need, and raises instead of lazily loading any other relationship
+    '''
+    columns = {Event.id}
+    for name in fields:
+        columns.update(EVENT_FIELDS[name][0])
+    options = [load_only(*columns)]
+    if 'genre' in fields:
+        options.append(joinedload(Event.genre_info).load_only(Genre.name))
+    options.append(raiseload('*'))
+    return Event.query.options(*options)
+
+
+def _ticket_types(event_ids):
+    # Ticket types of all the listed events from a single query, grouped per event
+    grouped = {event_id: [] for event_id in event_ids}
+    rows = db.session.execute(
+        select(ticket_type.event_id, ticket_type.id, ticket_type.type_name, ticket_type.description,
+               ticket_type.price, ticket_type.quantity_available, ticket_type.sold_count)
+        .where(ticket_type.event_id.in_(event_ids))
+        .order_by(ticket_type.event_id, ticket_type.id))
+    for event_id, *values in rows:
+        grouped[event_id].append(dict(zip(TICKET_FIELDS, values)))
+    return grouped
+
+
+def serialize_events(events, fields):
+    tickets = _ticket_types([event.id for event in events]) if 'ticket_types' in fields else {}
+    items = []
+    for event in events:
+        item = {name: EVENT_FIELDS[name][1](event) for name in fields if name != 'ticket_types'}
+        if 'ticket_types' in fields:
+            item['ticket_types'] = tickets[event.id]
+        items.append(item)
+    return items
+
+
+# ===============================
+# ENDPOINTS
+# ===============================
+
+@api_bp.route('/events')
+@read_only
+def events():
+    '''
+    events with the same filters as the listing page (genre, status, search), in pages
+    of ?limit= linked by ?after= / ?before= cursors, with ?fields= choosing the fields
+    '''
+    fields = requested_fields()
+    limit = min(max(request.args.get('limit', DEFAULT_LIMIT, type=int), 1), MAX_LIMIT)
+    search_text = request.args.get('search', '').strip()
+    query, rank = filter_events(event_query(fields), request.args.get('genre', ''),
+                                request.args.get('status', ''), search_text)
+    # Same order as the listing page: relevance for searches, then (start_datetime, id)
+    order = [(Event.start_datetime, False), (Event.id, False)]
+    if rank is not None:
+        order.insert(0, (rank, False))
+    page = keyset_paginate(query, order, limit,
+                           after=request.args.get('after'), before=request.args.get('before'))
+
+    def page_url(**cursor):
+        arguments = {key: value for key, value in request.args.items() if key not in ('after', 'before')}
+        return url_for('api.events', _external=True, **arguments, **cursor)
+
+    return json_response({
+        'data': serialize_events(page.items, fields),
+        'links': {
+            'next': page_url(after=page.next_cursor) if page.has_next else None,
+            'prev': page_url(before=page.prev_cursor) if page.has_prev else None,
+        },
+    })
+
+
+@api_bp.route('/events/<int:id>')
+@read_only
+def event(id):
+    '''
+    one event, with ?fields= choosing the fields
+    '''
+    fields = requested_fields()
+    event = event_query(fields).filter(Event.id == id).first_or_404()
+    return json_response({'data': serialize_events([event], fields)[0]})
+
+
+@api_bp.route('/events/<int:id>/tickets')
+@read_only
+def event_tickets(id):
+    '''
+    live ticket availability for one event
+    '''
+    event = event_query(['status', 'remaining_count', 'sold_count']).filter(Event.id == id).first_or_404()
+    return json_response({'data': {
+        'event_id': event.id,
+        'status': event.current_status,
+        'remaining_count': event.remaining_count,
+        'sold_count': event.sold_count,
+        'ticket_types': _ticket_types([event.id])[event.id],
+    }})
+
+
+@api_bp.route('/genres')
+@read_only
+def genres():
+    '''
+    every genre, for the genre filter
+    '''
+    rows = db.session.execute(select(Genre.id, Genre.name, Genre.description).order_by(Genre.name))
+    return json_response({'data': [{'id': genre_id, 'name': name, 'description': description}
+                                   for genre_id, name, description in rows]})
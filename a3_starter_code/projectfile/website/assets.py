@@ -0,0 +1,116 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from flask import request, send_from_directory
+
+# Fingerprinted copies, their compressed versions and the manifest live in static/dist
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+# Uploaded event images change at runtime and get their own content-hashed names
+SKIP_DIRS = {DIST_DIR, os.path.join('img', 'events')}
+# Only text formats shrink when compressed; images are already compressed
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.map'}
+# Served from dist/ the content can never change under the same name
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def _brotli():
+    # brotli is optional: without it only gzip copies are built
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def _write(path, data):
+    with open(path + '.part', 'wb') as output:
+        output.write(data)
+    os.replace(path + '.part', path)
+
+
+def build_static(static_folder):
+    '''
+    copy every static file to dist/ under a name containing its content hash, write
+    .gz (and .br with brotli installed) next to the text files, and record the
+    original -> fingerprinted names in dist/manifest.json; returns the manifest
+    '''
+    dist = os.path.join(static_folder, DIST_DIR)
+    if os.path.isdir(dist):
+        shutil.rmtree(dist)
+    brotli = _brotli()
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        relative_root = os.path.relpath(root, static_folder)
+        dirs[:] = sorted(d for d in dirs if os.path.normpath(os.path.join(relative_root, d)) not in SKIP_DIRS)
+        for name in sorted(files):
+            with open(os.path.join(root, name), 'rb') as source:
+                data = source.read()
+            stem, extension = os.path.splitext(name)
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            relative = os.path.normpath(os.path.join(relative_root, name)).replace(os.sep, '/')
+            fingerprinted = os.path.normpath(os.path.join(DIST_DIR, relative_root, f'{stem}.{digest}{extension}'))
+            target = os.path.join(static_folder, fingerprinted)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            _write(target, data)
+            if extension.lower() in COMPRESSIBLE:
+                _write(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    _write(target + '.br', brotli.compress(data, quality=11))
+            manifest[relative] = fingerprinted.replace(os.sep, '/')
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _accepted_encodings():
+    return {part.split(';')[0].strip() for part in request.headers.get('Accept-Encoding', '').split(',')}
+
+
+def init_app(app):
+    '''
+    after `flask build-static`: make url_for('static', ...) point at the fingerprinted
+    files and serve those with far-future immutable caching and br/gzip negotiation
+    '''
+    manifest = load_manifest(app.static_folder)
+    app.extensions['static_manifest'] = manifest
+    if not manifest:
+        # Not built (e.g. in development): serve the plain files as before
+        return
+
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    default_static = app.view_functions['static']
+
+    def static(filename):
+        if not filename.startswith(DIST_DIR + '/'):
+            return default_static(filename=filename)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        accepted = _accepted_encodings()
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if encoding in accepted and os.path.isfile(os.path.join(app.static_folder, filename + suffix)):
+                response = send_from_directory(app.static_folder, filename + suffix,
+                                               mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(app.static_folder, filename, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+        if os.path.splitext(filename)[1].lower() in COMPRESSIBLE:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = static
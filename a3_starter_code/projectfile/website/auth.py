@@ -1,9 +1,9 @@
 from flask import Blueprint, flash, render_template, request, url_for, redirect
-from flask_bcrypt import generate_password_hash, check_password_hash
 from flask_login import login_user, login_required, logout_user
 from sqlalchemy.exc import IntegrityError
 from .models import User
 from .forms import LoginForm, RegisterForm
+from .passwords import hash_password, check_password, needs_rehash
 from . import db
 
 # Create a blueprint - make sure all BPs have unique names
@@ -26,9 +26,18 @@ def login():
         #if there is no user with that name
         if user is None:
             error = 'Incorrect username'#could be a security risk to give this much info away
-        #check the password - notice password hash function
-        elif not check_password_hash(user.password_hash, password): # takes the hash and password
-            error = 'Incorrect password'
+        #check the password - notice password hash function (bcrypt runs in the hashing worker processes)
+        else:
+            try:
+                if not check_password(user.password_hash, password): # takes the hash and password
+                    error = 'Incorrect password'
+                elif needs_rehash(user.password_hash):
+                    # Made at an older cost: replace it now that we have the plain password
+                    user.password_hash = hash_password(password)
+                    db.session.commit()
+            except TimeoutError as e:
+                db.session.rollback()
+                error = str(e)
         if error is None:
             # set the login_user of flask_login to manage the user
             login_user(user)
@@ -67,7 +76,11 @@ def register():
             return redirect(url_for('auth.register'))
         
         # password hashing
-        pwd_hash = generate_password_hash(pwd)
+        try:
+            pwd_hash = hash_password(pwd)
+        except TimeoutError as e:
+            flash(str(e))
+            return redirect(url_for('auth.register'))
         # create a new User model object
         new_user = User(firstName=firstName,surname=surname,mobileNumber=phoneNumber, streetAddress=address, password_hash=pwd_hash, email=email)
         
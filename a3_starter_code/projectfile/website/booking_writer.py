@@ -0,0 +1,150 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from flask import current_app
+from sqlalchemy import text
+from .models import Event
+from .inventory import place_order
+from . import db
+
+
+class _OrderRequest:
+    def __init__(self, user_id, event_id, cart_items, hold_ids):
+        self.user_id = user_id
+        self.event_id = event_id
+        self.cart_items = cart_items
+        self.hold_ids = hold_ids
+        self.future = Future()
+
+
+class BookingWriter:
+    '''
+    single writer thread that commits queued bookings in batches.
+
+    Request threads hand their cart to submit() and block until the batch containing it
+    is committed. Each order runs inside its own SAVEPOINT, so a sold out cart only rolls
+    back itself, and the whole batch shares one transaction and one commit (fsync)
+    instead of one per booking
+    '''
+    def __init__(self, app, batch_size=64, max_wait=0.001):
+        self.app = app
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='booking-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, user_id, event_id, cart_items, hold_ids=None, timeout=30):
+        '''
+        queue an order and wait for it to be committed; returns the order id or
+        re-raises whatever place_order raised for this cart.
+
+        After `timeout` seconds an order still in the queue is withdrawn (the writer
+        skips it) and TimeoutError is raised. One whose batch has already started is
+        waited for instead, so a caller is never told a committed booking failed
+        '''
+        request = _OrderRequest(user_id, event_id, cart_items, hold_ids)
+        self.queue.put(request)
+        try:
+            return request.future.result(timeout)
+        except TimeoutError:
+            if request.future.cancel():
+                raise
+            return request.future.result()
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _next_batch(self):
+        # Block for the first request, then take whatever else arrives within max_wait
+        first = self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            try:
+                request = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if request is None:
+                # Finish this batch, then stop
+                self.queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            with self.app.app_context():
+                self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        # Claim the requests; ones whose callers gave up waiting are dropped here
+        batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        results = []
+        try:
+            if db.engine.dialect.name == 'sqlite':
+                # pysqlite only opens a transaction before DML, so without this the first
+                # SAVEPOINT would become the transaction and its RELEASE would commit it.
+                # IMMEDIATE also takes the write lock up front instead of upgrading mid-batch
+                db.session.execute(text('BEGIN IMMEDIATE'))
+            for request in batch:
+                try:
+                    with db.session.begin_nested():
+                        event = db.session.get(Event, request.event_id)
+                        order = place_order(request.user_id, event, request.cart_items, request.hold_ids)
+                    results.append((request, order.id, None))
+                except ValueError as e:
+                    results.append((request, None, e))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Booking batch of {len(batch)} failed: {e}")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        for request, order_id, error in results:
+            if error is not None:
+                request.future.set_exception(error)
+            else:
+                request.future.set_result(order_id)
+
+
+# Guards starting the writer when several request threads hit it at once
+_start_lock = threading.Lock()
+
+
+def booking_writer():
+    '''
+    the app's booking writer, started on first use
+    '''
+    extensions = current_app.extensions
+    with _start_lock:
+        if 'booking_writer' not in extensions:
+            extensions['booking_writer'] = BookingWriter(current_app._get_current_object(),
+                                                         batch_size=current_app.config['BOOKING_BATCH_SIZE'],
+                                                         max_wait=current_app.config['BOOKING_BATCH_WAIT'])
+    return extensions['booking_writer']
+
+
+def commit_order(user_id, event, cart_items, hold_ids=None):
+    '''
+    place and commit an order, through the booking writer when BOOKING_GROUP_COMMIT
+    is on and with a commit of its own otherwise; returns the order id
+    '''
+    if current_app.config['BOOKING_GROUP_COMMIT']:
+        order_id = booking_writer().submit(user_id, event.id, cart_items, hold_ids)
+        # The writer changed the counters in another session
+        db.session.expire(event)
+        return order_id
+    order = place_order(user_id, event, cart_items, hold_ids)
+    db.session.commit()
+    return order.id
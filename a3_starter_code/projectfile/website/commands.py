@@ -0,0 +1,100 @@
+import os
+import click
+from flask import Blueprint, current_app
+from .counters import rebuild_ticket_counters, check_ticket_counters
+from .inventory import release_expired_holds
+from .images import make_variants, image_manifest
+from .assets import build_static
+from .seed import seed_database, SEED_PASSWORD
+from .sales import rebuild_sales_daily
+from .models import Event
+from . import db
+
+# Maintenance commands, run with: flask --app website <command>
+commands_bp = Blueprint('commands', __name__, cli_group=None)
+
+
+@commands_bp.cli.command('recount-tickets')
+@click.option('--check', is_flag=True, help='Only report counters that disagree with the bookings table.')
+def recount_tickets(check):
+    '''
+    rebuild the sold/remaining ticket counters from the bookings table
+    '''
+    problems = check_ticket_counters()
+    for problem in problems:
+        click.echo(problem)
+    if check:
+        if problems:
+            raise SystemExit(1)
+        click.echo("Ticket counters are consistent.")
+        return
+    rebuild_ticket_counters()
+    click.echo(f"Ticket counters rebuilt ({len(problems)} mismatches fixed).")
+
+
+@commands_bp.cli.command('release-holds')
+@click.option('--batch-size', default=1000, show_default=True, help='Holds released per transaction.')
+def release_holds(batch_size):
+    '''
+    return the tickets of expired checkout holds to sale
+    '''
+    released = release_expired_holds(batch_size=batch_size)
+    click.echo(f"Released {released} expired ticket holds.")
+
+
+@commands_bp.cli.command('process-images')
+def process_images():
+    '''
+    make the resized variants for uploaded event images that don't have them yet
+    '''
+    app = current_app._get_current_object()
+    uploads = db.session.scalars(
+        db.select(Event.image_filename).distinct()
+        .where(Event.image_filename.is_not(None), Event.image_filename.not_like('http%')))
+    processed = 0
+    for image_filename in uploads:
+        if image_manifest(image_filename) is not None:
+            continue
+        if not os.path.exists(os.path.join(app.static_folder, image_filename)):
+            click.echo(f"Missing file: {image_filename}")
+            continue
+        if make_variants(app, image_filename) is None:
+            raise SystemExit("Install Pillow to make image variants.")
+        processed += 1
+    click.echo(f"Made variants for {processed} images.")
+
+
+@commands_bp.cli.command('build-static')
+def build_static_command():
+    '''
+    fingerprint and precompress the static files into static/dist
+    '''
+    manifest = build_static(current_app.static_folder)
+    click.echo(f"Built {len(manifest)} static files into static/dist; restart the app to serve them.")
+
+
+@commands_bp.cli.command('backfill-sales')
+def backfill_sales():
+    '''
+    rebuild the sales_daily rollup from the confirmed bookings
+    '''
+    rows = rebuild_sales_daily()
+    click.echo(f"Rebuilt sales_daily: {rows} event/ticket type/day rows.")
+
+
+@commands_bp.cli.command('seed')
+@click.option('--users', default=20000, show_default=True, help='Users to add (about 2% become event creators).')
+@click.option('--events', default=2000, show_default=True, help='Events to add, each with 1-4 ticket types.')
+@click.option('--orders', default=200000, show_default=True, help='Orders to attempt; sold-out events turn some away.')
+@click.option('--comments', default=50000, show_default=True, help='Comments to add.')
+@click.option('--seed', default=0, show_default=True, help='Random seed; the same seed generates the same data.')
+@click.option('--batch-size', default=10000, show_default=True, help='Rows per executemany insert.')
+def seed(users, events, orders, comments, seed, batch_size):
+    '''
+    bulk-generate realistic demo data (users, events, ticket types, orders, bookings, comments)
+    '''
+    try:
+        added = seed_database(users, events, orders, comments, seed=seed, batch_size=batch_size, echo=click.echo)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    click.echo(f"Seeded {sum(added.values())} rows; users log in as userN@seed.example.com / {SEED_PASSWORD}.")
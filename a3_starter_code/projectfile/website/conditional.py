@@ -0,0 +1,73 @@
+import hashlib
+import os
+import time
+from functools import wraps
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+
+def _deploy_version(app):
+    # Changes when the templates change, so a deploy never answers 304 with an old page;
+    # the same in every worker process, unlike a start-up timestamp
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        dirs.sort()
+        for name in sorted(files):
+            stat = os.stat(os.path.join(root, name))
+            digest.update(f'{name}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    digest.update(repr(sorted(app.extensions.get('static_manifest', {}).items())).encode())
+    return digest.hexdigest()
+
+
+def make_etag(*parts):
+    '''
+    ETag value for a page built from these parts (anything with a stable repr)
+    '''
+    app = current_app._get_current_object()
+    if 'etag_version' not in app.extensions:
+        app.extensions['etag_version'] = _deploy_version(app)
+    return hashlib.sha1(repr((app.extensions['etag_version'],) + parts).encode()).hexdigest()
+
+
+def viewer_parts():
+    '''
+    the parts of a page that depend on who is looking at it: the logged-in user, and
+    a time bucket so a 304 never keeps a CSRF token past WTF_CSRF_TIME_LIMIT
+    '''
+    if not current_user.is_authenticated:
+        return ('anonymous',)
+    limit = current_app.config.get('WTF_CSRF_TIME_LIMIT') or 3600
+    return (current_user.id, current_user.updated_at, session.get('csrf_token'), int(time.time() // (limit / 2)))
+
+
+def conditional(etag_function):
+    '''
+    answer If-None-Match with 304 before the view runs. etag_function gets the view's
+    arguments and returns the page's ETag from a cheap query, or None to skip
+    conditional handling for this request
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # A pending flash message is shown once, so that page can't be reused
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+            etag = etag_function(*args, **kwargs)
+            if etag is None:
+                return view(*args, **kwargs)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            # Weak: the page is equivalent, not byte-identical (e.g. CSRF tokens)
+            response.set_etag(etag, weak=True)
+            # Always revalidate, and keep per-user pages out of shared caches
+            response.cache_control.no_cache = True
+            if current_user.is_authenticated:
+                response.cache_control.private = True
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,92 @@
+import os
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value not in (None, '') else default
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ''):
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class Config:
+    '''
+    default settings for the web application, each overridable with an environment
+    variable of the same name (e.g. DATABASE_URL, SQLITE_BUSY_TIMEOUT)
+    '''
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'somesecretkey')
+    # Relative sqlite paths live in the instance folder
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///sitedata.sqlite')
+    # Engine for @read_only views, e.g. a replica; unset means a read-only
+    # connection to the SQLite file, or the primary for other databases
+    SQLALCHEMY_READ_URI = os.environ.get('DATABASE_READ_URL')
+    # seconds after a write that the user's pages are still read from the primary
+    READ_YOUR_WRITES_SECONDS = _env_int('READ_YOUR_WRITES_SECONDS', 5)
+
+    # Connection pool: enough connections for a threaded worker, recycled before
+    # server-side idle timeouts close them (ignored for in-memory SQLite)
+    DB_POOL_SIZE = _env_int('DB_POOL_SIZE', 10)
+    DB_MAX_OVERFLOW = _env_int('DB_MAX_OVERFLOW', 20)
+    DB_POOL_TIMEOUT = _env_int('DB_POOL_TIMEOUT', 30)
+    DB_POOL_RECYCLE = _env_int('DB_POOL_RECYCLE', 1800)
+
+    # SQLite pragmas applied to every new connection (see engine.py).
+    # WAL lets readers run alongside the writer; synchronous=NORMAL is safe with WAL
+    # and only syncs at checkpoints; busy_timeout makes writers wait for the lock
+    # instead of failing with "database is locked"
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT = _env_int('SQLITE_BUSY_TIMEOUT', 5000)  # milliseconds
+    SQLITE_MMAP_SIZE = _env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)  # bytes
+    SQLITE_CACHE_SIZE = _env_int('SQLITE_CACHE_SIZE', -64000)  # negative means KiB, so 64 MB
+
+    # bcrypt cost for new password hashes; existing hashes at another cost are redone at login
+    BCRYPT_LOG_ROUNDS = _env_int('BCRYPT_LOG_ROUNDS', 12)
+    # processes running bcrypt, so logins can't take every core (0 hashes in the request thread)
+    PASSWORD_HASH_WORKERS = _env_int('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1))
+    # seconds a login waits for a hashing slot and result before giving up
+    PASSWORD_HASH_TIMEOUT = _env_float('PASSWORD_HASH_TIMEOUT', 10)
+    # threads resizing uploaded event images into card/detail/hero variants
+    IMAGE_WORKERS = _env_int('IMAGE_WORKERS', 2)
+    # characters of rendered event card markup kept by the {% cache %} tag (0 disables it)
+    FRAGMENT_CACHE_MAX_SIZE = _env_int('FRAGMENT_CACHE_MAX_SIZE', 4_000_000)
+    # logged-in users kept by the user_loader so requests skip the users query (0 disables it)
+    USER_CACHE_SIZE = _env_int('USER_CACHE_SIZE', 10000)
+    # seconds a cached user is trusted; changes made by other workers show up after at most this
+    USER_CACHE_TTL = _env_int('USER_CACHE_TTL', 30)
+    # per-endpoint latency, SQL and template histograms served at /metrics (see metrics.py)
+    METRICS_ENABLED = _env_bool('METRICS_ENABLED', True)
+    # add an X-Query-Count header with the request's SQL statement count
+    METRICS_QUERY_HEADER = _env_bool('METRICS_QUERY_HEADER', False)
+    # serve /metrics to other hosts than localhost (e.g. a scraper on the network)
+    METRICS_ALLOW_REMOTE = _env_bool('METRICS_ALLOW_REMOTE', False)
+    # development/test aid: log SELECTs repeated QUERY_AUDIT_REPEAT_LIMIT times in one
+    # request (N+1 patterns) and requests over their QUERY_BUDGETS entry (see query_audit.py)
+    QUERY_AUDIT = _env_bool('QUERY_AUDIT', False)
+    QUERY_AUDIT_REPEAT_LIMIT = _env_int('QUERY_AUDIT_REPEAT_LIMIT', 5)
+    # endpoint -> maximum SQL statements per request, e.g. {'main.booking_history': 10}
+    QUERY_BUDGETS = {}
+    QUERY_AUDIT_DEFAULT_BUDGET = None
+    # raise QueryBudgetExceeded instead of only logging, so a test run fails
+    QUERY_AUDIT_RAISE = _env_bool('QUERY_AUDIT_RAISE', False)
+    # seconds the homepage popular/recommended rankings may lag behind other workers' sales
+    RANKINGS_MAX_STALENESS = _env_int('RANKINGS_MAX_STALENESS', 60)
+    # seconds an attendee manifest ?since= pull reaches back, for bookings stamped before the
+    # previous pull but committed after it (writers waiting on the lock, group-commit batches)
+    MANIFEST_OVERLAP_SECONDS = _env_int('MANIFEST_OVERLAP_SECONDS', 60)
+    # seconds tickets stay reserved for a cart at checkout before they go back on sale
+    TICKET_HOLD_SECONDS = _env_int('TICKET_HOLD_SECONDS', 600)
+    # queue bookings to one writer thread that commits them in batches (see booking_writer.py)
+    BOOKING_GROUP_COMMIT = _env_bool('BOOKING_GROUP_COMMIT', False)
+    BOOKING_BATCH_SIZE = _env_int('BOOKING_BATCH_SIZE', 64)
+    # seconds the writer waits for more bookings to join a batch
+    BOOKING_BATCH_WAIT = _env_float('BOOKING_BATCH_WAIT', 0.001)
@@ -0,0 +1,64 @@
+from sqlalchemy import func, select, update
+from .models import Event, Booking, ticket_type
+from . import db
+
+
+def _confirmed_sold(ticket_type_id):
+    # Correlated subquery: confirmed tickets booked against one ticket type
+    return (select(func.coalesce(func.sum(Booking.quantity), 0))
+            .where(Booking.ticket_type_id == ticket_type_id,
+                   Booking.booking_status == 'confirmed')
+            .scalar_subquery())
+
+
+def _event_totals():
+    # Correlated subqueries: sold and remaining tickets summed over an event's ticket types
+    sold = (select(func.coalesce(func.sum(ticket_type.sold_count), 0))
+            .where(ticket_type.event_id == Event.id)
+            .scalar_subquery())
+    remaining = (select(func.coalesce(func.sum(ticket_type.quantity_available), 0))
+                 .where(ticket_type.event_id == Event.id)
+                 .scalar_subquery())
+    return sold, remaining
+
+
+def rebuild_ticket_counters():
+    '''
+    recalculate sold_count on every ticket type from the bookings table,
+    then roll the ticket type counters up into the events table
+    '''
+    db.session.execute(
+        update(ticket_type).values(sold_count=_confirmed_sold(ticket_type.id)),
+        execution_options={'synchronize_session': False})
+    sold, remaining = _event_totals()
+    db.session.execute(
+        update(Event).values(sold_count=sold, remaining_count=remaining),
+        execution_options={'synchronize_session': False})
+    db.session.commit()
+
+
+def check_ticket_counters():
+    '''
+    compare the stored counters against the underlying rows and
+    return a list of human readable mismatches (empty when consistent)
+    '''
+    problems = []
+
+    expected_sold = _confirmed_sold(ticket_type.id).label('expected_sold')
+    rows = db.session.execute(
+        select(ticket_type.id, ticket_type.event_id, ticket_type.sold_count, expected_sold)
+        .where(ticket_type.sold_count != expected_sold))
+    for ticket_id, event_id, stored, expected in rows:
+        problems.append(f"ticket_type {ticket_id} (event {event_id}): sold_count is {stored}, bookings say {expected}")
+
+    sold, remaining = _event_totals()
+    rows = db.session.execute(
+        select(Event.id, Event.sold_count, Event.remaining_count, sold.label('expected_sold'), remaining.label('expected_remaining'))
+        .where((Event.sold_count != sold) | (Event.remaining_count != remaining)))
+    for event_id, stored_sold, stored_remaining, expected_sold, expected_remaining in rows:
+        if stored_sold != expected_sold:
+            problems.append(f"event {event_id}: sold_count is {stored_sold}, ticket types say {expected_sold}")
+        if stored_remaining != expected_remaining:
+            problems.append(f"event {event_id}: remaining_count is {stored_remaining}, ticket types say {expected_remaining}")
+
+    return problems
@@ -0,0 +1,52 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(config):
+    '''
+    SQLALCHEMY_ENGINE_OPTIONS built from the DB_POOL_* settings; options already
+    given in the config take precedence
+    '''
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if not _is_memory_sqlite(url):
+        # In-memory SQLite uses a single static connection, which takes no pool settings
+        options.setdefault('pool_size', config['DB_POOL_SIZE'])
+        options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+        options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+        options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+    if url.get_backend_name() != 'sqlite':
+        # Drop connections the server closed while they sat in the pool
+        options.setdefault('pool_pre_ping', True)
+    return options
+
+
+def sqlite_pragmas(config, read_only=False):
+    pragmas = [f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT'])}"]
+    if not read_only:
+        # The journal mode is stored in the database file, so only the writer sets it
+        pragmas.append(f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+        pragmas.append(f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}")
+    pragmas.append(f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}")
+    pragmas.append(f"PRAGMA cache_size = {int(config['SQLITE_CACHE_SIZE'])}")
+    return pragmas
+
+
+def configure_engine(engine, config, read_only=False):
+    '''
+    run the SQLite pragmas from the config on every new connection of this engine
+    '''
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(config, read_only)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
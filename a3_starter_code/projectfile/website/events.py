@@ -1,9 +1,20 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, abort, session
-from .models import Event, Comment, ticket_type, Order, OrderItem, Booking, User, Genre
-from .forms import EventForm, TicketForm, CommentForm, CheckoutForm, BookingForm, EditCommentForm
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, current_app, abort, session, stream_with_context
+from .models import Event, Comment, ticket_type, Order, OrderItem, Booking, User, Genre, TicketHold
+from .search import search_events
+from .pagination import keyset_paginate
+from .routing import read_only
+from .conditional import conditional, make_etag, viewer_parts
+from .images import store_upload, image_version, variants_updated
+from .rankings import record_ticket_sale, invalidate_rankings
+from .booking_writer import commit_order
+from .inventory import (place_holds, release_holds, release_expired_holds, held_tickets, held_by_ticket_type,
+                        restock_tickets, remove_ticket_type, InsufficientTickets)
+from .exports import attendee_rows, stream_csv, stream_ndjson, MANIFEST_COLUMNS
+from .forms import EventForm, TicketForm, CommentForm, CheckoutForm, BookingForm, EditCommentForm, ClearCartForm
 from . import db
-import os
 from werkzeug.utils import secure_filename
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
 from flask_login import login_required, current_user
 from flask_wtf.csrf import generate_csrf
 from decimal import Decimal
@@ -11,28 +22,88 @@ from datetime import datetime
 
 eventbp = Blueprint('event', __name__, url_prefix='/events')
 
+# Page sizes for the keyset-paginated listings
+EVENTS_PER_PAGE = 24
+COMMENTS_PER_PAGE = 20
+
+def details_etag(id):
+    '''
+    ETag for the details page from one query: the event's version and counters, its
+    ticket types, its comments (and their authors) and its unexpired ticket holds,
+    plus which variants of its image are ready
+    '''
+    row = db.session.execute(
+        select(Event.image_filename, Event.updated_at, Event.current_status, Event.sold_count, Event.remaining_count,
+               select(func.max(ticket_type.updated_at)).where(ticket_type.event_id == Event.id).scalar_subquery(),
+               select(func.count(Comment.id)).where(Comment.event_id == Event.id).scalar_subquery(),
+               select(func.max(Comment.created_at)).where(Comment.event_id == Event.id).scalar_subquery(),
+               select(func.max(Comment.edited_at)).where(Comment.event_id == Event.id).scalar_subquery(),
+               # The comments show their authors' names, which live on the users rows
+               select(func.max(User.updated_at)).join(Comment, Comment.user_id == User.id)
+               .where(Comment.event_id == Event.id).scalar_subquery(),
+               select(func.count(TicketHold.id)).where(TicketHold.event_id == Event.id,
+                                                       TicketHold.expires_at > datetime.now()).scalar_subquery())
+        .where(Event.id == id)).first()
+    if row is None:
+        return None  # let the view answer 404
+    # Drops this process's cached misses if another process has made variants since
+    variants_updated()
+    return make_etag('details', request.full_path, tuple(row), image_version(row.image_filename), viewer_parts())
+
+
 @eventbp.route('/<int:id>')
+@read_only
+@conditional(details_etag)
 def details(id):
     '''
     show the event details and the comments
     '''
     event = db.session.query(Event).filter_by(id=id).first_or_404()
     cform = CommentForm()
-    comments = event.comments.order_by(Comment.created_at.desc()).all() # order the comments by the date they were created
-    return render_template('events/eventDetails.html', event=event, form=cform, comments=comments)
+    status = event.current_status
+    reserved = 0
+    if status == 'Sold Out':
+        # Whether tickets are held is decided by expires_at, not by whether the sweeper has
+        # run: tickets in lapsed holds are on sale again (booking sweeps them back first),
+        # and those in live ones are only reserved at checkout, not sold
+        if held_tickets(event.id, expired=True):
+            status = 'Open'
+        else:
+            reserved = held_tickets(event.id)
+    # newest comments first, one page at a time using the (created_at, id) cursor
+    comments_query = Comment.query.filter_by(event_id=event.id).options(joinedload(Comment.user))
+    comments_page = keyset_paginate(
+        comments_query,
+        [(Comment.created_at, True), (Comment.id, True)],
+        COMMENTS_PER_PAGE,
+        after=request.args.get('after'),
+        before=request.args.get('before'))
+    return render_template('events/eventDetails.html', event=event, form=cform, comments=comments_page.items, comments_page=comments_page,
+                           status=status, reserved=reserved)
+
+
+def allevents_etag():
+    '''
+    ETag for the events listing, for anonymous visitors only: any event added, removed,
+    edited, sold or started since (current_status depends on the clock), or any image
+    getting its variants, changes it
+    '''
+    if current_user.is_authenticated:
+        return None
+    row = db.session.execute(
+        select(func.count(Event.id),
+               func.max(Event.updated_at),
+               func.count(Event.id).filter(Event.start_datetime < datetime.now()),
+               select(func.max(Genre.updated_at)).scalar_subquery(),
+               select(func.count(Genre.id)).scalar_subquery())).first()
+    return make_etag('allevents', request.full_path, tuple(row), variants_updated(), viewer_parts())
 
 
-@eventbp.route('/eventspage')
-def allevents():
+def filter_events(query, genre_filter, status_filter, search_text):
     '''
-    show all the events
+    apply the event listing filters (genre name, status, search text) to an Event query;
+    returns the query and the search relevance column to order by, or None
     '''
-    # Get search text from query parameters (for user story 3.4)
-    search_text = request.args.get('search', '').strip()
-    genre_filter = request.args.get('genre', '')
-    # Build base query
-    query = Event.query
-
     if genre_filter:
         # Filter by genre name instead of genre_id
         genre = Genre.query.filter_by(name=genre_filter).first()
@@ -40,27 +111,54 @@ def allevents():
             query = query.filter_by(genre_id=genre.id)
         else:
             query = query.filter(False)  # No matching genre, return empty
-    else:
-        # No genre filter applied; keep base query
-        pass
 
-    # Apply search filter if provided
+    # Filter by status in the database using the SQL form of Event.current_status
+    if status_filter in Event.STATUSES:
+        query = query.filter(Event.current_status == status_filter)
+
+    # Apply search filter if provided, using the full-text index when the database has one
+    rank = None
     if search_text:
-        query = query.filter(
-            (Event.name.ilike(f"%{search_text}%")) |
-            (Event.description.ilike(f"%{search_text}%"))
-        )
+        query, rank = search_events(query, search_text)
+    return query, rank
+
 
-    # Execute query ordered by start datetime
-    events = query.order_by(Event.start_datetime.asc()).all()
+@eventbp.route('/eventspage')
+@read_only
+@conditional(allevents_etag)
+def allevents():
+    '''
+    show all the events
+    '''
+    # Get search text from query parameters (for user story 3.4)
+    search_text = request.args.get('search', '').strip()
+    genre_filter = request.args.get('genre', '')
+    status_filter = request.args.get('status', '')
+    # Build base query, loading each card's genre in the same query
+    query = Event.query.options(joinedload(Event.genre_info))
+    query, rank = filter_events(query, genre_filter, status_filter, search_text)
+
+    # Order by relevance for searches, otherwise by start datetime, with id as the tie-breaker
+    # so the order is unique and pages can continue from a (start_datetime, id) cursor
+    order = [(Event.start_datetime, False), (Event.id, False)]
+    if rank is not None:
+        order.insert(0, (rank, False))
+    events_page = keyset_paginate(
+        query, order, EVENTS_PER_PAGE,
+        after=request.args.get('after'),
+        before=request.args.get('before'))
 
     genres = db.session.scalars(db.select(Genre)).all()
 
     return render_template(
         'events/allEvents.html',
-        events=events,
+        events=events_page.items,
+        events_page=events_page,
+        filters={key: value for key, value in (('search', search_text), ('genre', genre_filter), ('status', status_filter)) if value},
         genres=genres,
         selected_genre=genre_filter,
+        statuses=Event.STATUSES,
+        selected_status=status_filter,
         search_text=search_text
     )
 
@@ -73,24 +171,10 @@ def check_upload_file(uploaded_file_data):
     
     filename = secure_filename(uploaded_file_data.filename)
     
-    upload_folder_abs = os.path.join(current_app.root_path, 'static', 'img', 'events')
-    
-    if not os.path.exists(upload_folder_abs):
-        os.makedirs(upload_folder_abs, exist_ok=True)
-    
-    upload_path_abs = os.path.join(upload_folder_abs, filename)
-    
     try:
-        uploaded_file_data.save(upload_path_abs)
-        
-        # Verify file was actually saved
-        if os.path.exists(upload_path_abs):
-            file_size = os.path.getsize(upload_path_abs)
-        else:
-            flash("Error: File was not saved to disk", "danger")
-            return None
-        
-        db_upload_path = os.path.join('img', 'events', filename).replace(os.sep, '/')
+        # Stored under a hash of its content (so repeat uploads are deduplicated);
+        # the card/detail/hero variants are made on the image worker pool
+        db_upload_path = store_upload(uploaded_file_data)
         flash(f"Image uploaded successfully: {filename}", "success")
         return db_upload_path
     except Exception as e:
@@ -155,8 +239,11 @@ def create():
                         event_id=new_event.id, type_name='VIP',
                         price=ticketform.vip_price.data, quantity_available=ticketform.vip_quantity.data)
                     db.session.add(vip_ticket)
+                # Every ticket is still available on a new event
+                new_event.remaining_count = (ticketform.general_quantity.data or 0) + (ticketform.vip_quantity.data or 0)
                 
                 db.session.commit()
+                invalidate_rankings()
                 flash(f'Event "{new_event.name}" created successfully!', 'success')
                 return redirect(url_for('event.details', id=new_event.id))
             except Exception as e:
@@ -177,6 +264,15 @@ def edit_event(id):
         flash("You are not authorized to edit this event.", "danger")
         return redirect(url_for('event.details', id=id))
 
+    # Put lapsed holds back first, so the totals below only count tickets really at checkout
+    try:
+        release_expired_holds(batch_size=100, max_batches=1, event_id=event_to_edit.id)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Expired hold sweep failed: {e}")
+    # Tickets out of inventory in checkout holds, per ticket type: part of the total like sold ones
+    held = held_by_ticket_type(event_to_edit.id)
+
     # Initialize forms 
     form = EventForm()
     ticketform = TicketForm()
@@ -217,35 +313,35 @@ def edit_event(id):
         general_t = event_to_edit.ticket_types.filter_by(type_name='General Admission').first()
         if general_t:
             ticketform.general_price.data = int(general_t.price) if general_t.price is not None else None
-            # Calculate total quantity = available + sold
-            general_sold = sum(booking.quantity for booking in general_t.bookings if booking.booking_status == 'confirmed')
-            ticketform.general_quantity.data = general_t.quantity_available + general_sold
+            # Calculate total quantity = available + sold + held at checkout
+            ticketform.general_quantity.data = general_t.quantity_available + general_t.sold_count + held.get(general_t.id, 0)
         
         vip_t = event_to_edit.ticket_types.filter_by(type_name='VIP').first()
         if vip_t:
             ticketform.vip_price.data = int(vip_t.price) if vip_t.price is not None else None
-            # Calculate total quantity = available + sold
-            vip_sold = sum(booking.quantity for booking in vip_t.bookings if booking.booking_status == 'confirmed')
-            ticketform.vip_quantity.data = vip_t.quantity_available + vip_sold
+            # Calculate total quantity = available + sold + held at checkout
+            ticketform.vip_quantity.data = vip_t.quantity_available + vip_t.sold_count + held.get(vip_t.id, 0)
 
     # Calculate ticket sales information for display in template
     ticket_sales_info = {}
     general_t = event_to_edit.ticket_types.filter_by(type_name='General Admission').first()
     if general_t:
-        general_sold = sum(booking.quantity for booking in general_t.bookings if booking.booking_status == 'confirmed')
-        ticket_sales_info['general_sold'] = general_sold
+        ticket_sales_info['general_sold'] = general_t.sold_count
+        ticket_sales_info['general_held'] = held.get(general_t.id, 0)
         ticket_sales_info['general_available'] = general_t.quantity_available
     else:
         ticket_sales_info['general_sold'] = 0
+        ticket_sales_info['general_held'] = 0
         ticket_sales_info['general_available'] = 0
     
     vip_t = event_to_edit.ticket_types.filter_by(type_name='VIP').first()
     if vip_t:
-        vip_sold = sum(booking.quantity for booking in vip_t.bookings if booking.booking_status == 'confirmed')
-        ticket_sales_info['vip_sold'] = vip_sold
+        ticket_sales_info['vip_sold'] = vip_t.sold_count
+        ticket_sales_info['vip_held'] = held.get(vip_t.id, 0)
         ticket_sales_info['vip_available'] = vip_t.quantity_available
     else:
         ticket_sales_info['vip_sold'] = 0
+        ticket_sales_info['vip_held'] = 0
         ticket_sales_info['vip_available'] = 0
 
     if request.method == 'POST':
@@ -270,6 +366,7 @@ def edit_event(id):
             # Set the final image filename
             event_to_edit.image_filename = image_filename_to_save
             
+            changes, removals = [], []
             ticket_types_to_update = {
                 'General Admission': (ticketform.general_price.data, ticketform.general_quantity.data),
                 'VIP': (ticketform.vip_price.data, ticketform.vip_quantity.data)
@@ -279,42 +376,89 @@ def edit_event(id):
                 existing_ticket = event_to_edit.ticket_types.filter_by(type_name=type_name_key).first()
                 if price_data is not None and limit_data is not None:
                     if existing_ticket:
-                        # Calculate how many tickets have been sold for this ticket type
-                        sold_tickets = sum(booking.quantity for booking in existing_ticket.bookings if booking.booking_status == 'confirmed')
+                        # How many tickets have been sold for this ticket type, or are held at checkout
+                        sold_tickets = existing_ticket.sold_count
+                        held_tickets_of_type = held.get(existing_ticket.id, 0)
                         
-                        # Check if the new quantity is less than already sold tickets
-                        if limit_data < sold_tickets:
-                            flash(f"Cannot set {type_name_key} quantity to {limit_data}. {sold_tickets} tickets have already been sold.", "danger")
+                        # Check if the new quantity is less than already sold (or held) tickets
+                        if limit_data < sold_tickets + held_tickets_of_type:
+                            reserved_note = f" and {held_tickets_of_type} are reserved at checkout" if held_tickets_of_type else ""
+                            flash(f"Cannot set {type_name_key} quantity to {limit_data}. {sold_tickets} tickets have already been sold{reserved_note}.", "danger")
                             return render_template('events/editEvent.html', form=form, ticketform=ticketform, event_id=event_to_edit.id, event=event_to_edit, title=f"Edit Event: {event_to_edit.name}", ticket_sales_info=ticket_sales_info)
                         
                         existing_ticket.price = float(price_data) 
-                        # New available quantity = new total quantity - sold tickets
-                        existing_ticket.quantity_available = limit_data - sold_tickets
+                        # Change the available quantity by the difference from the current total,
+                        # in SQL, so tickets booked since it was read aren't written over
+                        delta = (limit_data - sold_tickets - held_tickets_of_type) - existing_ticket.quantity_available
+                        if delta:
+                            changes.append((existing_ticket, delta, type_name_key))
                     else:
                         new_ticket = ticket_type(
                             event_id=event_to_edit.id,
                             type_name=type_name_key,
                             price=float(price_data), 
-                            quantity_available=limit_data
+                            quantity_available=0
                         )
                         db.session.add(new_ticket)
+                        changes.append((new_ticket, limit_data, type_name_key))
                 elif existing_ticket:
                     # Check if any tickets have been sold before deleting
-                    sold_tickets = sum(booking.quantity for booking in existing_ticket.bookings if booking.booking_status == 'confirmed')
+                    sold_tickets = existing_ticket.sold_count
                     if sold_tickets > 0:
                         flash(f"Cannot remove {type_name_key} tickets. {sold_tickets} tickets have already been sold.", "danger")
                         return render_template('events/editEvent.html', form=form, ticketform=ticketform, event_id=event_to_edit.id, event=event_to_edit, title=f"Edit Event: {event_to_edit.name}", ticket_sales_info=ticket_sales_info)
-                    db.session.delete(existing_ticket)
+                    removals.append((existing_ticket.id, type_name_key))
             try:
+                db.session.flush()  # Get the new ticket types' IDs
+                for ticket, delta, type_name_key in changes:
+                    restock_tickets(event_to_edit.id, ticket.id, delta, type_name_key)
+                for ticket_type_id, type_name_key in removals:
+                    remove_ticket_type(event_to_edit.id, ticket_type_id, type_name_key)
                 db.session.commit()
+                invalidate_rankings()
                 flash(f'Event "{event_to_edit.name}" updated successfully!', 'success')
                 return redirect(url_for('event.details', id=event_to_edit.id))
+            except InsufficientTickets as e:
+                db.session.rollback()
+                flash(f"{e}; nothing was saved. Please review the quantities and try again.", "danger")
             except Exception as e:
                 db.session.rollback()
                 current_app.logger.error(f"Error updating event: {e}")
                 flash(f"Error updating event: {str(e)}", "danger")
     return render_template('events/editEvent.html', form=form, ticketform=ticketform, event_id=event_to_edit.id, event=event_to_edit, title=f"Edit Event: {event_to_edit.name}", ticket_sales_info=ticket_sales_info)
 
+@eventbp.route('/<int:id>/attendees.<any(csv, ndjson):file_format>')
+@login_required
+def attendee_manifest(id, file_format):
+    '''
+    stream the event's attendee list to its creator as CSV or NDJSON;
+    ?since=<X-Manifest-As-Of of the previous pull> returns only bookings created or
+    changed since then (plus an overlap, see attendee_rows)
+    '''
+    event = db.session.query(Event).filter_by(id=id).first_or_404()
+    if event.created_by != current_user.id:
+        abort(403)
+    since = request.args.get('since')
+    if since:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError:
+            abort(400, "since must be an ISO timestamp, e.g. 2025-05-31T18:00:00")
+        if since.tzinfo is not None:
+            # Bookings are stamped in the server's local time, without a zone
+            since = since.astimezone().replace(tzinfo=None)
+    # Taken before the query, so every booking stamped after it is in the next pull
+    as_of = datetime.now()
+    rows = attendee_rows(event.id, since=since or None)
+    # Rows are written out as they are fetched, so memory stays flat for any size of event
+    if file_format == 'csv':
+        body, mimetype = stream_csv(MANIFEST_COLUMNS, rows), 'text/csv'
+    else:
+        body, mimetype = stream_ndjson(MANIFEST_COLUMNS, rows), 'application/x-ndjson'
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=event-{event.id}-attendees.{file_format}',
+                             'X-Manifest-As-Of': as_of.isoformat()})
+
 @eventbp.route('/<int:id>/cancel_confirm', methods=['GET'])
 @login_required
 def cancel_confirm(id):
@@ -346,6 +490,7 @@ def cancel_event_confirmed(id):
     try:
         event.status = 'Cancelled'
         db.session.commit()
+        invalidate_rankings()
         flash(f'The event "{event.name}" has been successfully cancelled.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -429,6 +574,20 @@ def book_tickets(id):
     """Main booking page where users select ticket quantities"""
     event = db.session.query(Event).filter_by(id=id).first_or_404()
     form = BookingForm()
+    # Abandoned checkouts may be holding this event's last tickets: put the expired
+    # ones back on sale before deciding what is left (a read when there are none)
+    try:
+        if release_expired_holds(batch_size=100, max_batches=1, event_id=event.id):
+            db.session.refresh(event)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Expired hold sweep failed: {e}")
+    # Tickets reserved in other carts come back if those checkouts aren't completed
+    if event.current_status == 'Sold Out' and held_tickets(event.id):
+        minutes = current_app.config['TICKET_HOLD_SECONDS'] // 60
+        flash("All remaining tickets are reserved by other customers at checkout. Reservations that "
+              f"aren't completed are released within {minutes} minutes, so please check back soon.", "warning")
+        return redirect(url_for('event.details', id=id))
     # Check if event is available for booking
     if event.current_status in ['Cancelled', 'Sold Out', 'Completed', 'Inactive']:
         flash(f"Sorry, this event is {event.current_status.lower()} and not available for booking.", "warning")
@@ -440,16 +599,16 @@ def book_tickets(id):
         return redirect(url_for('event.details', id=id))
     if form.validate_on_submit():
         cart_items = []
-        total_amount = Decimal('0.00') # Process each ticket type
         
         # use for loop to process each ticket type, get the quantity of the ticket type, and check if the quantity is valid
         for ticket in ticket_types:
             quantity_field = f'quantity_{ticket.id}'
             quantity = request.form.get(quantity_field, type=int)
-            if quantity and quantity > 0:
-                if quantity > ticket.quantity_available:
-                    flash(f"Sorry, only {ticket.quantity_available} {ticket.type_name} tickets are available.", "danger")
-                    return render_template('events/bookTickets.html', event=event, ticket_types=ticket_types, form=form)
+            if not quantity or quantity <= 0:
+                continue  # this ticket type was not selected
+            if quantity > ticket.quantity_available:
+                flash(f"Sorry, only {ticket.quantity_available} {ticket.type_name} tickets are available.", "danger")
+                return render_template('events/bookTickets.html', event=event, ticket_types=ticket_types, form=form)
             if quantity > 10:
                 # Limit per transaction
                 flash("Maximum 10 tickets per type per transaction.", "danger")
@@ -461,43 +620,22 @@ def book_tickets(id):
                                 'quantity': quantity,
                                 'subtotal': subtotal
                                 })
-            total_amount += subtotal
             
         # if the cart is empty, flash a message and return the booking page
         if not cart_items:
             flash("Please select at least one ticket to proceed.", "warning")
             return render_template('events/bookTickets.html', event=event, ticket_types=ticket_types, form=form)
+        if request.form.get('action') == 'hold':
+            return hold_tickets(event, ticket_types, form, cart_items)
             # Directly create the booking without payment processing
         try:
-            # Create the order
-            order = Order(
-                user_id=current_user.id, 
-                event_id=event.id, 
-                total_amount=total_amount, 
-                order_status='confirmed') # Directly confirmed for assignment
-            db.session.add(order)
-            db.session.flush()  # Get the order ID
-            # Create order items and update ticket availability
-            for item in cart_items:
-                # Check ticket availability again
-                ticket = db.session.query(ticket_type).filter_by(id=item['ticket_type_id']).first()
-                if not ticket or ticket.quantity_available < item['quantity']:
-                    raise ValueError(f"Insufficient tickets available for {item['ticket_type_name']}")
-                # Create order item
-                order_item = OrderItem(order_id=order.id, ticket_type_id=item['ticket_type_id'], quantity=item['quantity'], unit_price=item['price'], subtotal=item['subtotal'])
-                db.session.add(order_item)
-                # Update ticket availability
-                ticket.quantity_available -= item['quantity']
-                # Create individual booking records for each ticket
-                booking = Booking(user_id=current_user.id, event_id=event.id, order_id=order.id, ticket_type_id=item['ticket_type_id'], quantity=item['quantity'], total_price=item['subtotal'], booking_status='confirmed')
-                db.session.add(booking)
-            # Check if event should be marked as sold out
-            remaining_tickets = sum(t.quantity_available for t in event.ticket_types)
-            if remaining_tickets == 0:
-                event.status = 'Sold Out'
-            db.session.commit()
+            # Create the order, order items and bookings (directly confirmed for assignment);
+            # tickets are claimed with a conditional UPDATE so parallel bookings can't oversell
+            # (batched with other bookings into one commit when BOOKING_GROUP_COMMIT is on)
+            order_id = commit_order(current_user.id, event, cart_items)
+            record_ticket_sale(event)
             flash(f'🎉 Congratulations! Your booking for "{event.name}" has been confirmed!', 'success')
-            return redirect(url_for('event.booking_confirmation', id=event.id, order_id=order.id))
+            return redirect(url_for('event.booking_confirmation', id=event.id, order_id=order_id))
         except ValueError as e:
             db.session.rollback()
             flash(str(e), "danger")
@@ -510,6 +648,48 @@ def book_tickets(id):
     return render_template('events/bookTickets.html', event=event, ticket_types=ticket_types, form=form)
 
 
+def hold_tickets(event, ticket_types, form, cart_items):
+    '''
+    reserve the selected tickets for TICKET_HOLD_SECONDS and send the user to checkout
+    '''
+    try:
+        # Holds left over from an earlier cart go back first, so one user can't pile them up
+        old_cart = session.get('cart')
+        if old_cart and old_cart.get('hold_ids'):
+            release_holds(old_cart['hold_ids'], current_user.id)
+        hold_ids, expires_at = place_holds(current_user.id, event, cart_items)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        flash(str(e), "danger")
+        return render_template('events/bookTickets.html', event=event, ticket_types=ticket_types, form=form)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Hold error: {e}")
+        flash("Sorry, there was an error reserving your tickets. Please try again.", "danger")
+        return render_template('events/bookTickets.html', event=event, ticket_types=ticket_types, form=form)
+
+    # Piggyback a small sweep of expired holds on hold creation so abandoned carts
+    # return to sale even without the release-holds command being scheduled
+    try:
+        release_expired_holds(batch_size=100, max_batches=1)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Expired hold sweep failed: {e}")
+
+    # The session cookie is JSON, so keep only plain values in the cart
+    session['cart'] = {
+        'event_id': event.id,
+        'items': [dict(item, price=float(item['price']), subtotal=float(item['subtotal'])) for item in cart_items],
+        'total_amount': float(sum(item['subtotal'] for item in cart_items)),
+        'hold_ids': hold_ids,
+        'expires_at': expires_at.isoformat(),
+    }
+    minutes = current_app.config['TICKET_HOLD_SECONDS'] // 60
+    flash(f"Your tickets are reserved for {minutes} minutes. Please complete checkout before then.", "info")
+    return redirect(url_for('event.checkout', id=event.id))
+
+
 @eventbp.route('/<int:id>/checkout', methods=['GET', 'POST'])
 @login_required
 def checkout(id):
@@ -523,72 +703,32 @@ def checkout(id):
     if not cart or cart.get('event_id') != event.id:
         flash("Your cart is empty or has expired. Please select tickets again.", "warning")
         return redirect(url_for('event.book_tickets', id=id))
+    expires_at = datetime.fromisoformat(cart['expires_at']) if cart.get('expires_at') else None
+    if expires_at and expires_at <= datetime.now():
+        session.pop('cart', None)
+        flash("Your ticket reservation has expired. Please select tickets again.", "warning")
+        return redirect(url_for('event.book_tickets', id=id))
     
     form = CheckoutForm()
     
     if form.validate_on_submit():
         try:
-            # Start database transaction
-            # Create the order
-            order = Order(
-                user_id=current_user.id,
-                event_id=event.id,
-                total_amount=Decimal(str(cart['total_amount'])),
-                order_status='pending'
-            )
-            db.session.add(order)
-            db.session.flush()  # Get the order ID
-            
-            # Create order items and update ticket availability, use for loop to process each order item
-            for item in cart['items']:
-                # Check ticket availability again
-                ticket = db.session.query(ticket_type).filter_by(id=item['ticket_type_id']).first()
-                if not ticket or ticket.quantity_available < item['quantity']:
-                    raise ValueError(f"Insufficient tickets available for {item['ticket_type_name']}")
-                
-                # Create order item
-                order_item = OrderItem(
-                    order_id=order.id,
-                    ticket_type_id=item['ticket_type_id'],
-                    quantity=item['quantity'],
-                    unit_price=item['price'],
-                    subtotal=item['subtotal']
-                )
-                db.session.add(order_item)
-                
-                # Update ticket availability
-                ticket.quantity_available -= item['quantity']
-                
-                # Create individual booking records for each ticket
-                booking = Booking(
-                    user_id=current_user.id,
-                    event_id=event.id,
-                    order_id=order.id,
-                    ticket_type_id=item['ticket_type_id'],
-                    quantity=item['quantity'],
-                    total_price=item['subtotal'],
-                    booking_status='confirmed'
-                )
-                db.session.add(booking)
-            
-            # Mark order as confirmed
-            order.order_status = 'confirmed'
-            
-            # Check if event should be marked as sold out
-            remaining_tickets = sum(t.quantity_available for t in event.ticket_types)
-            if remaining_tickets == 0:
-                event.status = 'Sold Out'
-            
-            db.session.commit()
+            # Create the order, order items and bookings in one transaction; held tickets
+            # are already out of inventory, anything else is claimed with a conditional UPDATE
+            order_id = commit_order(current_user.id, event, cart['items'], hold_ids=cart.get('hold_ids'))
+            record_ticket_sale(event)
             
             # Clear cart
             session.pop('cart', None)
             
             flash(f'🎉 Congratulations! Your booking for "{event.name}" has been confirmed!', 'success')
-            return redirect(url_for('event.booking_confirmation', id=event.id, order_id=order.id))
+            return redirect(url_for('event.booking_confirmation', id=event.id, order_id=order_id))
             
         except ValueError as e:
             db.session.rollback()
+            if cart.get('hold_ids'):
+                # The holds are gone (expired or already used), so the cart is no good either
+                session.pop('cart', None)
             flash(str(e), "danger")
             return redirect(url_for('event.book_tickets', id=id))
         except Exception as e:
@@ -597,7 +737,7 @@ def checkout(id):
             flash("Sorry, there was an error processing your booking. Please try again.", "danger")
             return redirect(url_for('event.book_tickets', id=id))
     
-    return render_template('events/checkout.html', event=event, cart=cart, form=form)
+    return render_template('events/checkout.html', event=event, cart=cart, form=form, expires_at=expires_at)
 
 
 @eventbp.route('/<int:id>/booking-confirmation/<int:order_id>')
@@ -625,12 +765,19 @@ def booking_confirmation(id, order_id):
                          order_items=order_items)
 
 
-@eventbp.route('/cart/clear')
+@eventbp.route('/cart/clear', methods=['POST'])
 @login_required
 def clear_cart():
     '''
     clear the shopping cart
     '''
-    session.pop('cart', None)
+    if not ClearCartForm().validate_on_submit():
+        flash("Your cart could not be cleared. Please try again.", "danger")
+        return redirect(request.referrer or url_for('event.allevents'))
+    cart = session.pop('cart', None)
+    if cart and cart.get('hold_ids'):
+        # Put the reserved tickets back on sale now rather than when the hold expires
+        release_holds(cart['hold_ids'], current_user.id)
+        db.session.commit()
     flash("Your cart has been cleared.", "info")
     return redirect(request.referrer or url_for('event.allevents'))
\ No newline at end of file
@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import select
+from .models import Booking, User, ticket_type
+from . import db
+
+# Columns of the attendee manifest, in order
+MANIFEST_COLUMNS = ['booking_id', 'order_id', 'status', 'ticket_type', 'quantity', 'total_price',
+                    'booked_at', 'updated_at', 'first_name', 'surname', 'email', 'mobile']
+# Rows fetched from the database at a time, and bytes of output sent at a time
+FETCH_SIZE = 1000
+CHUNK_SIZE = 16384
+
+
+def attendee_rows(event_id, since=None):
+    '''
+    the event's bookings with their attendee and ticket type, oldest change first.
+    With since (a naive local time, e.g. the X-Manifest-As-Of of the previous pull),
+    only bookings created or changed from MANIFEST_OVERLAP_SECONDS before it on.
+
+    updated_at is stamped when a booking is flushed, but the row only becomes
+    visible at commit (later still through the group-commit writer), so a pull can
+    miss a booking stamped before it that commits after it. The overlap re-sends
+    those, along with rows sharing a timestamp; clients upsert by booking_id.
+
+    A generator: the query runs on the first row, on a server-side cursor where the
+    database has one, and FETCH_SIZE rows are held at a time
+    '''
+    query = (select(Booking.id, Booking.order_id, Booking.booking_status, ticket_type.type_name,
+                    Booking.quantity, Booking.total_price, Booking.booking_date, Booking.updated_at,
+                    User.firstName, User.surname, User.email, User.mobileNumber)
+             .join(User, User.id == Booking.user_id)
+             .join(ticket_type, ticket_type.id == Booking.ticket_type_id)
+             .where(Booking.event_id == event_id)
+             # ix_bookings_event_updated's order, so the rows are read from the index without a sort
+             .order_by(Booking.updated_at, Booking.id))
+    if since is not None:
+        overlap = timedelta(seconds=current_app.config['MANIFEST_OVERLAP_SECONDS'])
+        query = query.where(Booking.updated_at >= since - overlap)
+    yield from db.session.execute(query, execution_options={'stream_results': True, 'yield_per': FETCH_SIZE})
+
+
+def _plain(value):
+    # One text form for dates and amounts in both formats, which a since= parameter accepts back
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def stream_csv(columns, rows):
+    '''
+    CSV text for the rows, yielded in CHUNK_SIZE pieces
+    '''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_plain(value) for value in row])
+        if buffer.tell() > CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(columns, rows):
+    '''
+    one JSON object per row and line (newline-delimited JSON), yielded in CHUNK_SIZE pieces
+    '''
+    lines = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(columns, (_plain(value) for value in row))))
+        lines.append(line)
+        size += len(line) + 1
+        if size > CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+            size = 0
+    if lines:
+        yield '\n'.join(lines) + '\n'
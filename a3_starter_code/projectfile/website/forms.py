@@ -6,6 +6,11 @@ from wtforms.validators import (InputRequired, Length, Email, EqualTo, Regexp,
 from wtforms.widgets import TextInput
 from datetime import datetime
 
+# bcrypt hashes at most 72 bytes of a password (and bcrypt 5 raises on longer ones), so reject them up front
+def password_byte_limit(form, field):
+    if field.data and len(field.data.encode('utf-8')) > 72:
+        raise ValidationError("Password must be at most 72 bytes long (72 characters, fewer with accents or emoji).")
+
 # Form for user login, handling email and password input
 class LoginForm(FlaskForm):
     email = StringField("Email Address", validators=[InputRequired(), Email("Please enter a valid email")])
@@ -32,6 +37,7 @@ class RegisterForm(FlaskForm):
     streetAddress = StringField("Street Address", validators=[InputRequired(), Length(max=150)]) 
     password = PasswordField("Password", validators=[
         InputRequired(),
+        password_byte_limit,
         EqualTo('confirm', message="Passwords should match"),
         Regexp(r'^(?=.*[A-Z])(?=.*\d)(?=.*[!@#$%^&*(),.?":{}|<>])[A-Za-z\d!@#$%^&*(),.?":{}|<>]{8,}$', 
                message="Password must be at least 8 characters and contain at least one uppercase letter, one symbol, and one number.")
@@ -181,12 +187,18 @@ class BookingForm(FlaskForm):
     """Simple form for booking tickets - handles CSRF and dynamic quantities"""
     submit = SubmitField('Proceed to Checkout')
 
+# Form for releasing the tickets held by the cart; changes inventory, so it has to be a CSRF-checked POST
+class ClearCartForm(FlaskForm):
+    """Form for clearing the cart and giving its reserved tickets back"""
+    submit = SubmitField('Release them')
+
 # Form for changing the user's password, requiring current password and new password confirmation
 class ChangePasswordForm(FlaskForm):
     """Form for changing user password"""
     current_password = PasswordField('Current Password', validators=[InputRequired('Please enter your current password')])
     new_password = PasswordField('New Password', validators=[
         InputRequired('Please enter a new password'),
+        password_byte_limit,
         EqualTo('confirm_password', message="Passwords should match"),
         Regexp(r'^(?=.*[A-Z])(?=.*\d)(?=.*[!@#$%^&*(),.?":{}|<>])[A-Za-z\d!@#$%^&*(),.?":{}|<>]{8,}$', 
                message="Password must be at least 8 characters and contain at least one uppercase letter, one symbol, and one number.")
@@ -221,6 +233,7 @@ class ProfileUpdateForm(FlaskForm):
     
     new_password = PasswordField('New Password (leave blank to keep current)', validators=[
         Optional(),
+        password_byte_limit,
         EqualTo('confirm_password', message="New passwords must match"),
         Regexp(r'^(?=.*[A-Z])(?=.*\d)(?=.*[!@#$%^&*(),.?":{}|<>])[A-Za-z\d!@#$%^&*(),.?":{}|<>]{8,}$', 
                message="Password must be at least 8 characters and contain at least one uppercase letter, one symbol, and one number.")
@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+
+class FragmentCache:
+    '''
+    in-process LRU of rendered template fragments, bounded by the total length of
+    the stored markup; the least recently used fragments are evicted first
+    '''
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_size:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_size:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+class FragmentCacheExtension(Extension):
+    '''
+    {% cache 'name', key, ... %}markup{% endcache %}
+
+    renders the block once per distinct key and serves it from the app's FragmentCache
+    afterwards. The keys must cover everything the block shows (e.g. event.id,
+    event.updated_at, event.current_status, image_version(event.image_filename) for
+    its srcset, and related rows such as the genre name, which can change without
+    touching event.updated_at), and the block must not depend on the current user or request
+    '''
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        keys = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            keys.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cached', [nodes.Tuple(keys, 'load')]),
+                               [], [], body).set_lineno(lineno)
+
+    def _cached(self, keys, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        value = cache.get(keys)
+        if value is None:
+            value = caller()
+            cache.set(keys, value)
+        return value
+
+
+def init_app(app):
+    '''
+    enable the {% cache %} tag; FRAGMENT_CACHE_MAX_SIZE = 0 renders every block uncached
+    '''
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    max_size = app.config['FRAGMENT_CACHE_MAX_SIZE']
+    app.jinja_env.fragment_cache = FragmentCache(max_size) if max_size else None
+    app.extensions['fragment_cache'] = app.jinja_env.fragment_cache
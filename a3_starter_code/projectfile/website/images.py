@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from markupsafe import Markup, escape
+from flask import current_app, url_for
+
+# Resized variants made for every uploaded event image: name -> width in pixels
+VARIANTS = {'card': 480, 'detail': 960, 'hero': 1920}
+# Layout width of each variant's slot, for the <img sizes> attribute
+VARIANT_SIZES = {
+    'card': '(max-width: 768px) 100vw, 480px',
+    'detail': '(max-width: 768px) 100vw, 960px',
+    'hero': '100vw',
+}
+# Uploads live in static/img/events, variants and their manifest in a subfolder
+UPLOAD_DIR = 'img/events'
+VARIANT_DIR = 'img/events/variants'
+
+_pool_lock = threading.Lock()
+# Manifests already found on disk; variants never change once written
+_manifests = {}
+# Images found without a manifest, and when: looked for again after MANIFEST_RECHECK_SECONDS
+# in case another process (a worker's pool, `flask process-images`) has made the variants since
+_missing = {}
+MANIFEST_RECHECK_SECONDS = 60
+# Images queued or being processed, so a repeat upload doesn't process them twice
+_pending = set()
+# Touched (by whichever process makes them) after each image's variants are written
+VARIANTS_STAMP = f'{VARIANT_DIR}/.updated'
+_stamp_seen = None
+
+
+def _pillow():
+    # Pillow is optional: without it uploads are stored but not resized
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    return Image, ImageOps
+
+
+def _static_path(app, relative):
+    return os.path.join(app.static_folder, *relative.split('/'))
+
+
+def _variant_base(image_filename):
+    # Variants mirror the image's full path under VARIANT_DIR (img/events/a.jpg ->
+    # img/events/variants/img/events/a.jpg-card.webp), so no two images share names
+    return f'{VARIANT_DIR}/{image_filename}'
+
+
+def _pool(app):
+    if 'image_pool' not in app.extensions:
+        app.extensions['image_pool'] = ThreadPoolExecutor(max_workers=app.config['IMAGE_WORKERS'],
+                                                          thread_name_prefix='image')
+    return app.extensions['image_pool']
+
+
+def store_upload(file_storage):
+    '''
+    save an uploaded image under the hash of its content and queue the resizing;
+    returns the path relative to static/ (the same file uploaded twice is stored once)
+    '''
+    app = current_app._get_current_object()
+    data = file_storage.read()
+    extension = os.path.splitext(file_storage.filename)[1].lower() or '.jpg'
+    filename = f"{hashlib.sha256(data).hexdigest()[:20]}{extension}"
+    image_filename = f'{UPLOAD_DIR}/{filename}'
+    path = _static_path(app, image_filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not os.path.exists(path):
+        # Write to a temporary name first so a half-written file is never served
+        with open(path + '.part', 'wb') as output:
+            output.write(data)
+        os.replace(path + '.part', path)
+    if image_manifest(image_filename) is None:
+        with _pool_lock:
+            queued = image_filename in _pending
+            _pending.add(image_filename)
+            pool = _pool(app)
+        if not queued:
+            pool.submit(_process_in_background, app, image_filename)
+    return image_filename
+
+
+def _process_in_background(app, image_filename):
+    try:
+        make_variants(app, image_filename)
+    except Exception as e:
+        app.logger.error(f"Image processing failed for {image_filename}: {e}")
+    finally:
+        with _pool_lock:
+            _pending.discard(image_filename)
+
+
+def make_variants(app, image_filename):
+    '''
+    write the card/detail/hero variants of a stored image as WebP and JPEG, plus a
+    manifest of their widths; returns the manifest, or None without Pillow
+    '''
+    pillow = _pillow()
+    if pillow is None:
+        app.logger.info("Pillow is not installed; event images are served without resized variants")
+        return None
+    Image, ImageOps = pillow
+    base = _static_path(app, _variant_base(image_filename))
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+
+    with Image.open(_static_path(app, image_filename)) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    manifest = {'width': image.width, 'variants': {}}
+    for name, width in VARIANTS.items():
+        if width >= image.width:
+            # Never upscale: the original is already small enough for this slot
+            continue
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.LANCZOS)
+        if resized.mode not in ('RGB', 'RGBA'):
+            resized = resized.convert('RGBA' if 'A' in resized.getbands() else 'RGB')
+        outputs = {
+            'webp': (resized, 'WEBP', {'quality': 80, 'method': 4}),
+            # JPEG has no alpha channel
+            'jpg': (resized.convert('RGB'), 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+        }
+        for extension, (variant, image_format, options) in outputs.items():
+            path = f'{base}-{name}.{extension}'
+            variant.save(path + '.part', image_format, **options)
+            os.replace(path + '.part', path)
+        manifest['variants'][name] = width
+
+    # The manifest goes last: its presence means every variant is on disk
+    manifest_path = f'{base}.json'
+    with open(manifest_path + '.part', 'w') as output:
+        json.dump(manifest, output)
+    os.replace(manifest_path + '.part', manifest_path)
+    _manifests[image_filename] = manifest
+    _missing.pop(image_filename, None)
+    stamp_path = _static_path(app, VARIANTS_STAMP)
+    with open(stamp_path, 'a'):
+        pass
+    os.utime(stamp_path)
+    return manifest
+
+
+def image_manifest(image_filename):
+    '''
+    the variant manifest of an uploaded image, or None while it is still being processed
+    '''
+    if image_filename in _manifests:
+        return _manifests[image_filename]
+    checked = _missing.get(image_filename)
+    if checked is not None and time.monotonic() - checked < MANIFEST_RECHECK_SECONDS:
+        return None
+    path = _static_path(current_app, f'{_variant_base(image_filename)}.json')
+    try:
+        with open(path) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        # Not made (yet), or an image that never gets variants (e.g. the genre pictures)
+        _missing[image_filename] = time.monotonic()
+        return None
+    _manifests[image_filename] = manifest
+    _missing.pop(image_filename, None)
+    return manifest
+
+
+def image_version(image_filename):
+    '''
+    changes when an image's variants become available, so cached markup built
+    with event_image_attrs can be keyed on it (None for external or missing images)
+    '''
+    if not image_filename or image_filename.startswith('http'):
+        return None
+    manifest = image_manifest(image_filename)
+    if manifest is None:
+        return None
+    return tuple(sorted(manifest['variants'].items()))
+
+
+def variants_updated():
+    '''
+    when any image last got new variants (VARIANTS_STAMP's mtime, None before the
+    first), for the ETags of pages showing many images. A change also drops this
+    process's cached misses, so those pages are rendered with the new variants
+    '''
+    global _stamp_seen
+    try:
+        stamp = os.stat(_static_path(current_app, VARIANTS_STAMP)).st_mtime_ns
+    except OSError:
+        return None
+    if stamp != _stamp_seen:
+        _missing.clear()
+        _stamp_seen = stamp
+    return stamp
+
+
+def event_image_attrs(image_filename, size='card'):
+    '''
+    src, srcset and sizes attributes for a stored event image: WebP variants in the
+    srcset, the JPEG variant for the given size as src, and the original when the
+    image has no variants (yet)
+    '''
+    original = url_for('static', filename=image_filename)
+    manifest = image_manifest(image_filename)
+    if not manifest or not manifest['variants']:
+        return Markup(f'src="{escape(original)}"')
+    base = _variant_base(image_filename)
+    variants = manifest['variants']
+    # Fall back to the largest variant below the requested size for the src
+    fallback = size if size in variants else max(variants, key=variants.get)
+    src = url_for('static', filename=f'{base}-{fallback}.jpg')
+    candidates = [f"{url_for('static', filename=f'{base}-{name}.webp')} {width}w"
+                  for name, width in sorted(variants.items(), key=lambda item: item[1])]
+    candidates.append(f"{original} {manifest['width']}w")
+    return Markup(f'src="{escape(src)}" srcset="{escape(", ".join(candidates))}" '
+                  f'sizes="{escape(VARIANT_SIZES.get(size, VARIANT_SIZES["card"]))}"')
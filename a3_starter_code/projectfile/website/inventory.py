@@ -0,0 +1,285 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import bindparam, delete, func, select, update
+from .models import Event, ticket_type, Order, OrderItem, Booking, TicketHold
+from .sales import record_daily_sales
+from . import db
+
+
+class InsufficientTickets(ValueError):
+    '''
+    raised when a ticket type no longer has enough tickets for a booking
+    '''
+
+
+class HoldExpired(ValueError):
+    '''
+    raised when a checkout's ticket holds have expired or were already used
+    '''
+
+
+def claim_tickets(event_id, ticket_type_id, quantity, type_name, sold=True):
+    '''
+    take tickets out of inventory with one conditional UPDATE.
+
+    The availability check happens inside the UPDATE's WHERE clause, so two
+    workers can never both take the last tickets: the database applies the
+    decrements one at a time and the loser matches no row.
+    With sold=False the tickets are only reserved (for a hold), not counted as sold
+    '''
+    values = {'quantity_available': ticket_type.quantity_available - quantity}
+    if sold:
+        values['sold_count'] = ticket_type.sold_count + quantity
+    result = db.session.execute(
+        update(ticket_type)
+        .where(ticket_type.id == ticket_type_id,
+               ticket_type.event_id == event_id,
+               ticket_type.quantity_available >= quantity)
+        .values(values),
+        execution_options={'synchronize_session': False})
+    if result.rowcount != 1:
+        raise InsufficientTickets(f"Insufficient tickets available for {type_name}")
+    values = {'remaining_count': Event.remaining_count - quantity}
+    if sold:
+        values['sold_count'] = Event.sold_count + quantity
+    db.session.execute(
+        update(Event).where(Event.id == event_id).values(values),
+        execution_options={'synchronize_session': False})
+
+
+def restock_tickets(event_id, ticket_type_id, delta, type_name):
+    '''
+    add delta tickets (negative to take some away) to a ticket type and its event,
+    e.g. when the event's capacity is edited. The change is applied relative to the
+    current counts with a conditional UPDATE, like claim_tickets, so tickets booked or
+    held meanwhile are kept; raises InsufficientTickets if it would leave fewer than none
+    '''
+    result = db.session.execute(
+        update(ticket_type)
+        .where(ticket_type.id == ticket_type_id,
+               ticket_type.event_id == event_id,
+               ticket_type.quantity_available + delta >= 0)
+        .values(quantity_available=ticket_type.quantity_available + delta),
+        execution_options={'synchronize_session': False})
+    if result.rowcount != 1:
+        raise InsufficientTickets(f"{type_name} tickets were booked while you were editing")
+    db.session.execute(
+        update(Event).where(Event.id == event_id).values(remaining_count=Event.remaining_count + delta),
+        execution_options={'synchronize_session': False})
+
+
+def remove_ticket_type(event_id, ticket_type_id, type_name):
+    '''
+    delete a ticket type with no sales or holds and take its tickets off the event's
+    remaining count; raises InsufficientTickets if some were sold or held meanwhile
+    '''
+    removed = db.session.execute(
+        delete(ticket_type)
+        .where(ticket_type.id == ticket_type_id,
+               ticket_type.event_id == event_id,
+               ticket_type.sold_count == 0,
+               ~select(TicketHold.id).where(TicketHold.ticket_type_id == ticket_type_id).exists())
+        .returning(ticket_type.quantity_available),
+        execution_options={'synchronize_session': False}).first()
+    if removed is None:
+        raise InsufficientTickets(f"{type_name} tickets were booked while you were editing")
+    db.session.execute(
+        update(Event).where(Event.id == event_id).values(remaining_count=Event.remaining_count - removed[0]),
+        execution_options={'synchronize_session': False})
+
+
+def record_held_sale(event_id, ticket_type_id, quantity):
+    '''
+    count tickets that were already taken out of inventory by a hold as sold
+    '''
+    db.session.execute(
+        update(ticket_type)
+        .where(ticket_type.id == ticket_type_id)
+        .values(sold_count=ticket_type.sold_count + quantity),
+        execution_options={'synchronize_session': False})
+    db.session.execute(
+        update(Event)
+        .where(Event.id == event_id)
+        .values(sold_count=Event.sold_count + quantity),
+        execution_options={'synchronize_session': False})
+
+
+def place_order(user_id, event, cart_items, hold_ids=None):
+    '''
+    create the order, order items and bookings for a cart and claim the tickets,
+    all in the current transaction; the caller commits or rolls back.
+
+    cart_items are dicts with ticket_type_id, ticket_type_name, price, quantity and subtotal.
+    With hold_ids the tickets come from those holds instead of inventory
+    '''
+    total_amount = sum((Decimal(str(item['subtotal'])) for item in cart_items), Decimal('0.00'))
+    order = Order(user_id=user_id, event_id=event.id, total_amount=total_amount, order_status='confirmed')
+    db.session.add(order)
+    db.session.flush()  # Get the order ID
+
+    if hold_ids is not None:
+        consume_holds(hold_ids, user_id, event.id, cart_items)
+
+    for item in cart_items:
+        if hold_ids is not None:
+            record_held_sale(event.id, item['ticket_type_id'], item['quantity'])
+        else:
+            claim_tickets(event.id, item['ticket_type_id'], item['quantity'], item['ticket_type_name'])
+        db.session.add(OrderItem(order_id=order.id,
+                                 ticket_type_id=item['ticket_type_id'],
+                                 quantity=item['quantity'],
+                                 unit_price=Decimal(str(item['price'])),
+                                 subtotal=Decimal(str(item['subtotal']))))
+        db.session.add(Booking(user_id=user_id,
+                               event_id=event.id,
+                               order_id=order.id,
+                               ticket_type_id=item['ticket_type_id'],
+                               quantity=item['quantity'],
+                               total_price=Decimal(str(item['subtotal'])),
+                               booking_status='confirmed'))
+    # Keep the daily sales rollup in step, in the same transaction
+    record_daily_sales(event.id, cart_items)
+
+    # The counters were changed in SQL, so reload them before checking for a sell-out
+    db.session.expire(event, ['sold_count', 'remaining_count'])
+    if event.remaining_count == 0:
+        event.status = 'Sold Out'
+    return order
+
+
+# ===============================
+# TICKET HOLDS
+# ===============================
+
+def place_holds(user_id, event, cart_items):
+    '''
+    reserve the cart's tickets for TICKET_HOLD_SECONDS; the tickets leave inventory
+    now so they can't be sold to someone else during checkout.
+    Returns (hold ids, expiry time); the caller commits
+    '''
+    expires_at = datetime.now() + timedelta(seconds=current_app.config['TICKET_HOLD_SECONDS'])
+    holds = []
+    for item in cart_items:
+        claim_tickets(event.id, item['ticket_type_id'], item['quantity'], item['ticket_type_name'], sold=False)
+        holds.append(TicketHold(user_id=user_id, event_id=event.id, ticket_type_id=item['ticket_type_id'],
+                                quantity=item['quantity'], expires_at=expires_at))
+    db.session.add_all(holds)
+    db.session.flush()  # Get the hold IDs
+    return [hold.id for hold in holds], expires_at
+
+
+def consume_holds(hold_ids, user_id, event_id, cart_items):
+    '''
+    delete a checkout's unexpired holds so they can become bookings; raises
+    HoldExpired unless every hold was still there and matches the cart
+    '''
+    # DELETE ... RETURNING hands each hold to exactly one caller, even racing the sweeper
+    taken = db.session.execute(
+        delete(TicketHold)
+        .where(TicketHold.id.in_(hold_ids),
+               TicketHold.user_id == user_id,
+               TicketHold.event_id == event_id,
+               TicketHold.expires_at > datetime.now())
+        .returning(TicketHold.ticket_type_id, TicketHold.quantity),
+        execution_options={'synchronize_session': False}).all()
+    held = Counter()
+    for ticket_type_id, quantity in taken:
+        held[ticket_type_id] += quantity
+    wanted = Counter()
+    for item in cart_items:
+        wanted[item['ticket_type_id']] += item['quantity']
+    if len(taken) != len(hold_ids) or held != wanted:
+        raise HoldExpired("Your ticket reservation has expired. Please select tickets again.")
+
+
+def _return_to_inventory(released):
+    # released: (ticket_type_id, event_id, quantity) rows from deleted holds,
+    # added back with one executemany UPDATE per table
+    per_ticket = Counter()
+    per_event = Counter()
+    for ticket_type_id, event_id, quantity in released:
+        per_ticket[ticket_type_id] += quantity
+        per_event[event_id] += quantity
+    if per_ticket:
+        db.session.execute(
+            update(ticket_type.__table__)
+            .where(ticket_type.__table__.c.id == bindparam('ticket_id'))
+            .values(quantity_available=ticket_type.__table__.c.quantity_available + bindparam('quantity')),
+            [{'ticket_id': key, 'quantity': value} for key, value in per_ticket.items()])
+        db.session.execute(
+            update(Event.__table__)
+            .where(Event.__table__.c.id == bindparam('event_id'))
+            .values(remaining_count=Event.__table__.c.remaining_count + bindparam('quantity')),
+            [{'event_id': key, 'quantity': value} for key, value in per_event.items()])
+
+
+def release_holds(hold_ids, user_id):
+    '''
+    give a user's holds back to inventory straight away (e.g. when the cart is cleared);
+    the caller commits
+    '''
+    released = db.session.execute(
+        delete(TicketHold)
+        .where(TicketHold.id.in_(hold_ids), TicketHold.user_id == user_id)
+        .returning(TicketHold.ticket_type_id, TicketHold.event_id, TicketHold.quantity),
+        execution_options={'synchronize_session': False}).all()
+    _return_to_inventory(released)
+
+
+def release_expired_holds(batch_size=1000, max_batches=None, event_id=None):
+    '''
+    sweep expired holds back into inventory, one committed batch at a time.
+    Each batch is an index range scan on expires_at plus one grouped UPDATE per
+    table, so the cost follows the number of expired holds, not the table size.
+    With event_id only that event's holds are swept. Nothing is written (and no
+    write lock taken) when there is nothing to release.
+    Returns the number of holds released
+    '''
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        now = datetime.now()
+        expired = select(TicketHold.id).where(TicketHold.expires_at <= now)
+        if event_id is not None:
+            expired = expired.where(TicketHold.event_id == event_id)
+        hold_ids = db.session.scalars(expired.order_by(TicketHold.expires_at).limit(batch_size)).all()
+        if not hold_ids:
+            break
+        # DELETE ... RETURNING: a hold another sweeper got to first is simply not returned
+        released = db.session.execute(
+            delete(TicketHold)
+            .where(TicketHold.id.in_(hold_ids), TicketHold.expires_at <= now)
+            .returning(TicketHold.ticket_type_id, TicketHold.event_id, TicketHold.quantity),
+            execution_options={'synchronize_session': False}).all()
+        _return_to_inventory(released)
+        db.session.commit()
+        total += len(released)
+        batches += 1
+    return total
+
+
+def held_tickets(event_id, expired=False):
+    '''
+    tickets of the event reserved by unexpired checkout holds (out of inventory,
+    but back on sale if the checkout isn't completed). With expired=True, the tickets
+    in holds that have expired but not been swept yet: as good as back on sale, since
+    booking sweeps them first
+    '''
+    now = datetime.now()
+    return db.session.scalar(
+        select(func.coalesce(func.sum(TicketHold.quantity), 0))
+        .where(TicketHold.event_id == event_id,
+               TicketHold.expires_at <= now if expired else TicketHold.expires_at > now))
+
+
+def held_by_ticket_type(event_id):
+    '''
+    {ticket type id: tickets taken out of inventory by holds} for an event, counting
+    every hold not swept back yet, so available + sold + held is each type's capacity
+    '''
+    return dict(db.session.execute(
+        select(TicketHold.ticket_type_id, func.sum(TicketHold.quantity))
+        .where(TicketHold.event_id == event_id)
+        .group_by(TicketHold.ticket_type_id)).all())
@@ -0,0 +1,172 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, abort, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+# Upper bounds of the histogram buckets
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+# Only these addresses may read /metrics unless METRICS_ALLOW_REMOTE is set
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+class Histogram:
+    '''
+    Prometheus-style histogram with one label (the endpoint); kept per process
+    '''
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label, value):
+        with self.lock:
+            series = self.series.get(label)
+            if series is None:
+                series = self.series[label] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            # Counts are stored per bucket and made cumulative when exported
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for label, series in sorted(self.series.items()):
+                label = label.replace('\\', '\\\\').replace('"', '\\"')
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['buckets']):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{endpoint="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{endpoint="{label}",le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{endpoint="{label}"}} {series["sum"]}')
+                lines.append(f'{self.name}_count{{endpoint="{label}"}} {series["count"]}')
+        return lines
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.latency = Histogram('flask_request_duration_seconds',
+                                 'Total time spent handling the request.', SECONDS_BUCKETS)
+        self.sql_queries = Histogram('flask_request_sql_queries',
+                                     'SQL statements executed per request.', QUERY_BUCKETS)
+        self.sql_time = Histogram('flask_request_sql_seconds',
+                                  'Time spent executing SQL per request.', SECONDS_BUCKETS)
+        self.template_time = Histogram('flask_request_template_seconds',
+                                       'Time spent rendering templates per request.', SECONDS_BUCKETS)
+
+    def histograms(self):
+        return [self.latency, self.sql_queries, self.sql_time, self.template_time]
+
+    def expose(self):
+        lines = []
+        for histogram in self.histograms():
+            lines.extend(histogram.expose())
+        return '\n'.join(lines) + '\n'
+
+
+# ===============================
+# SQL AND TEMPLATE TIMING
+# ===============================
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'metrics_start' in g:
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if starts and has_request_context() and 'metrics_start' in g:
+        g.metrics_sql_time += time.perf_counter() - starts.pop()
+        g.metrics_sql_count += 1
+
+
+def _handle_error(context):
+    # A statement that raised never reaches after_cursor_execute: drop its start time,
+    # or it stays on the pooled connection and skews the next statement's timing
+    if context.connection is not None:
+        starts = context.connection.info.get('metrics_query_start')
+        if starts:
+            starts.pop()
+
+
+def instrument_engine(engine):
+    '''
+    count and time every statement run on this engine during a request
+    '''
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+
+def _before_render(sender, template, context, **extra):
+    if 'metrics_start' in g:
+        g.metrics_template_starts.append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    if 'metrics_start' in g and g.metrics_template_starts:
+        elapsed = time.perf_counter() - g.metrics_template_starts.pop()
+        # A template rendered inside another is already part of the outer render time
+        if not g.metrics_template_starts:
+            g.metrics_template_time += elapsed
+
+
+def cache_counters(app):
+    '''
+    hit/miss counters of the in-process caches (user_loader and {% cache %} fragments)
+    '''
+    caches = [(name, app.extensions.get(f'{name}_cache')) for name in ('user', 'fragment')]
+    lines = []
+    for counter in ('hits', 'misses'):
+        lines.append(f'# HELP flask_cache_{counter}_total Lookups of an in-process cache that were {counter}.')
+        lines.append(f'# TYPE flask_cache_{counter}_total counter')
+        for name, cache in caches:
+            if cache is not None:
+                lines.append(f'flask_cache_{counter}_total{{cache="{name}"}} {getattr(cache, counter)}')
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app, engines):
+    '''
+    record latency, SQL count/time and template time per endpoint and serve them at /metrics
+    '''
+    metrics = RequestMetrics()
+    app.extensions['metrics'] = metrics
+    for engine in engines:
+        instrument_engine(engine)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        g.metrics_sql_count = 0
+        g.metrics_sql_time = 0.0
+        g.metrics_template_time = 0.0
+        g.metrics_template_starts = []
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'metrics_start' not in g:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        metrics.latency.observe(endpoint, time.perf_counter() - g.metrics_start)
+        metrics.sql_queries.observe(endpoint, g.metrics_sql_count)
+        metrics.sql_time.observe(endpoint, g.metrics_sql_time)
+        metrics.template_time.observe(endpoint, g.metrics_template_time)
+        if app.config['METRICS_QUERY_HEADER']:
+            response.headers['X-Query-Count'] = str(g.metrics_sql_count)
+        return response
+
+    def metrics_view():
+        if not app.config['METRICS_ALLOW_REMOTE'] and request.remote_addr not in LOCAL_ADDRESSES:
+            abort(404)
+        return Response(metrics.expose() + cache_counters(app), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
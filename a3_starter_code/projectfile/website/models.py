@@ -1,6 +1,8 @@
 from . import db
 from datetime import datetime
 from flask_login import UserMixin
+from sqlalchemy import case
+from sqlalchemy.ext.hybrid import hybrid_property
 
 # Defines the User data model for storing user information
 # Inherits from db.Model for SQLAlchemy base model functionality
@@ -57,15 +59,23 @@ class ticket_type(db.Model):
     description = db.Column(db.Text, nullable=True) # Optional description for this ticket type
     price = db.Column(db.Float, nullable=False)  # Price of the ticket
     quantity_available = db.Column(db.Integer, nullable=False)  # Number of tickets available for this type
+    sold_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Confirmed tickets sold, kept in step with bookings
     created_at = db.Column(db.DateTime, default=datetime.now)  # Creation timestamp
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)  # Last update timestam
-    
+
+    # quantity_available already holds the remaining tickets, so expose it under the name Event uses
+    remaining_count = db.synonym('quantity_available')
+
     def __repr__(self):
         return f"Ticket Type: {self.type_name} - ${self.price} ({self.quantity_available} available)"
     
 # Defines the Event data model
 class Event(db.Model):
     __tablename__ = 'events'
+    __table_args__ = (
+        db.Index('ix_events_start_datetime_id', 'start_datetime', 'id'),  # Supports the (start_datetime, id) listing cursor
+        db.Index('ix_events_sold_count_created_at', 'sold_count', 'created_at'),  # Supports the homepage popular/recommended rankings
+    )
     id = db.Column(db.Integer, primary_key=True)  # Unique identifier for the event
     name = db.Column(db.String(120), index=True, nullable=False)  # Event name
     description = db.Column(db.Text, nullable=True)  # Optional detailed description of the event
@@ -78,6 +88,10 @@ class Event(db.Model):
     genre_id = db.Column(db.Integer, db.ForeignKey('genres.id'), nullable=False)  # Reference to Genre table
     artist_info = db.Column(db.Text, nullable=True) # Information about the artist(s)
     status = db.Column(db.String(20), default='Open', nullable=False)  # Current status of the event (e.g., Open, Cancelled)
+
+    # Ticket counters summed over the event's ticket types, kept up to date by the booking and edit routes
+    sold_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    remaining_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Additional optional event details
     age_limit = db.Column(db.Integer, nullable=True) 
@@ -104,8 +118,13 @@ class Event(db.Model):
     comments = db.relationship('Comment', backref='event', lazy='dynamic', cascade="all, delete-orphan")
     bookings = db.relationship('Booking', backref='event', lazy='dynamic', cascade="all, delete-orphan")
 
-    # Property to calculate the current, dynamic status of the event
-    @property
+    # Every value current_status can take, in the order the listing filter shows them
+    STATUSES = ['Open', 'Sold Out', 'Cancelled', 'Completed', 'Inactive']
+
+    # Hybrid property to calculate the current, dynamic status of the event
+    # On an instance it runs the Python below; on the class (Event.current_status) it is a SQL CASE
+    # expression, so listings can select and filter by status without loading each event first
+    @hybrid_property
     def current_status(self):
         """
         Returns the current status of the event based on business logic:
@@ -127,14 +146,24 @@ class Event(db.Model):
             return 'Inactive'
         
         # Check if sold out (no tickets available)
-        if self.ticket_types:
-            total_available = sum(ticket.quantity_available for ticket in self.ticket_types)
-            if total_available == 0:
-                return 'Sold Out'
+        if self.remaining_count == 0:
+            return 'Sold Out'
         
         # Default to open if none of the above conditions are met
         return 'Open'
 
+    @current_status.inplace.expression
+    @classmethod
+    def _current_status_expression(cls):
+        # Same rules as above, evaluated by the database
+        return case(
+            (cls.status == 'Cancelled', 'Cancelled'),
+            (cls.status == 'Completed', 'Completed'),
+            (cls.start_datetime < datetime.now(), 'Inactive'),
+            (cls.remaining_count == 0, 'Sold Out'),
+            else_='Open'
+        )
+
     # Provides a string representation of the Event object.
     def __repr__(self):
         return f"Event: {self.name}"
@@ -142,6 +171,9 @@ class Event(db.Model):
 # Defines the Comment data model for user comments on events
 class Comment(db.Model):
     __tablename__ = 'comments'
+    __table_args__ = (
+        db.Index('ix_comments_event_created_id', 'event_id', 'created_at', 'id'),  # Supports the per-event (created_at, id) cursor
+    )
     id = db.Column(db.Integer, primary_key=True) # Unique identifier for the comment
     text = db.Column(db.String(400), nullable=False)  # The content of the comment
     created_at = db.Column(db.DateTime, default=datetime.now)  # Timestamp of comment creation
@@ -195,6 +227,10 @@ class OrderItem(db.Model):
 # Defines the Booking data model
 class Booking(db.Model):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        db.Index('ix_bookings_event_status', 'event_id', 'booking_status'),  # Supports the per-event sales totals
+        db.Index('ix_bookings_event_updated', 'event_id', 'updated_at', 'id'),  # Supports the attendee manifest and its since= increments
+    )
     id = db.Column(db.Integer, primary_key=True) # Unique identifier for the booking
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False) # User who made the booking
     event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False) # Event being booked
@@ -226,4 +262,43 @@ class event_status(db.Model):
     
     # Provides a string representation of the event_status object
     def __repr__(self):
-        return f"Status: {self.status} on {self.status_date}"
\ No newline at end of file
+        return f"Status: {self.status} on {self.status_date}"
+
+# Defines the TicketHold data model: tickets reserved for a user's cart until expires_at
+# The tickets are already taken out of ticket_type.quantity_available while the hold exists;
+# confirming the checkout turns the hold into a booking, expiry returns the tickets
+class TicketHold(db.Model):
+    __tablename__ = 'ticket_holds'
+    __table_args__ = (
+        db.Index('ix_ticket_holds_event_expires', 'event_id', 'expires_at'),  # Per-event sweeps and the reserved-ticket count
+    )
+    id = db.Column(db.Integer, primary_key=True) # Unique identifier for the hold
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False) # User holding the tickets
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False) # Event the tickets belong to
+    ticket_type_id = db.Column(db.Integer, db.ForeignKey('ticket_type.id'), nullable=False) # Ticket type held
+    quantity = db.Column(db.Integer, nullable=False) # Number of tickets held
+    expires_at = db.Column(db.DateTime, nullable=False, index=True) # Indexed so expired holds can be swept in batches
+    created_at = db.Column(db.DateTime, default=datetime.now) # When the hold was placed
+
+    def __repr__(self):
+        return f"Hold #{self.id} - {self.quantity} tickets of type {self.ticket_type_id} until {self.expires_at}"
+
+# Defines the SalesDaily data model: tickets sold and revenue per event, ticket type and day.
+# Updated in the same transaction as every booking (see sales.record_daily_sales), so sales
+# reports read one row per day instead of scanning the bookings table
+class SalesDaily(db.Model):
+    __tablename__ = 'sales_daily'
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'ticket_type_id', 'sale_date', name='uq_sales_daily_event_type_date'),  # One row per day; the upsert target
+    )
+    id = db.Column(db.Integer, primary_key=True) # Unique identifier for the rollup row
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False) # Event the sales belong to
+    ticket_type_id = db.Column(db.Integer, db.ForeignKey('ticket_type.id'), nullable=False) # Ticket type sold
+    sale_date = db.Column(db.Date, nullable=False) # Day of the sales
+    orders = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Orders that included this ticket type
+    tickets_sold = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Tickets sold that day
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0, server_default='0') # Sum of the booking totals
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now) # Last sale added
+
+    def __repr__(self):
+        return f"Sales: event {self.event_id} type {self.ticket_type_id} on {self.sale_date} - {self.tickets_sold} tickets"
\ No newline at end of file
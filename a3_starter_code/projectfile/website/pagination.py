@@ -0,0 +1,125 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+
+class KeysetPage:
+    '''
+    one page of results from keyset_paginate, with opaque cursors for the
+    neighbouring pages (None when there is no page in that direction)
+    '''
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(values):
+    '''
+    pack the sort key of a row into a URL-safe string
+    '''
+    packed = [{'dt': value.isoformat()} if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(packed, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    '''
+    unpack a cursor made by encode_cursor; returns None if it is missing or malformed
+    '''
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        packed = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return [datetime.fromisoformat(value['dt']) if isinstance(value, dict) else value for value in packed]
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        return None
+
+
+def _fits(column, value):
+    # Whether a cursor value can be bound against the sort column: a crafted cursor
+    # (a list where a number belongs, say) would otherwise fail in the database driver
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        python_type = None
+    if python_type is float:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if python_type is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    if python_type is not None and python_type is not object:
+        return isinstance(value, python_type)
+    return isinstance(value, (int, float, str, datetime)) and not isinstance(value, bool)
+
+
+def _cursor_values(cursor, order):
+    # Decoded cursor values, or None when the cursor is missing or doesn't fit the order
+    values = decode_cursor(cursor)
+    if values is None or len(values) != len(order):
+        return None
+    if not all(_fits(column, value) for (column, _), value in zip(order, values)):
+        return None
+    return values
+
+
+def _after(order, values):
+    # Rows strictly after `values` in the given order:
+    # (a > x) OR (a = x AND b > y) OR ... with < for descending columns
+    clauses = []
+    for i, (column, descending) in enumerate(order):
+        equal_so_far = [order[j][0] == values[j] for j in range(i)]
+        beyond = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal_so_far, beyond))
+    return or_(*clauses)
+
+
+def keyset_paginate(query, order, per_page, after=None, before=None):
+    '''
+    paginate a query by the values of its sort key instead of OFFSET, so every
+    page costs the same index seek however deep it is.
+
+    order is a list of (column, descending) pairs ending in a unique column;
+    after/before are cursors from a previous page's next_cursor/prev_cursor; one
+    that is malformed or doesn't match the order's columns counts as no cursor
+    '''
+    after_values = _cursor_values(after, order)
+    before_values = _cursor_values(before, order) if after_values is None else None
+    backwards = before_values is not None
+
+    # Walking backwards reverses every column so the rows just before the cursor come first
+    walk = [(column, descending != backwards) for column, descending in order]
+    query = query.add_columns(*(column for column, _ in order))
+    if after_values is not None:
+        query = query.filter(_after(walk, after_values))
+    elif backwards:
+        query = query.filter(_after(walk, before_values))
+    query = query.order_by(*(column.desc() if descending else column.asc() for column, descending in walk))
+
+    # Fetch one extra row to find out whether another page follows
+    rows = query.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+    items = [row[0] for row in rows]
+    keys = [list(row[1:]) for row in rows]
+    if not keys:
+        return KeysetPage(items)
+
+    if backwards:
+        return KeysetPage(items,
+                          next_cursor=encode_cursor(keys[-1]),
+                          prev_cursor=encode_cursor(keys[0]) if more else None)
+    return KeysetPage(items,
+                      next_cursor=encode_cursor(keys[-1]) if more else None,
+                      prev_cursor=encode_cursor(keys[0]) if after_values is not None else None)
@@ -0,0 +1,119 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import bcrypt
+from flask import current_app
+
+# bcrypt runs in a pool of worker processes, so a burst of logins uses at most
+# PASSWORD_HASH_WORKERS cores and request threads only wait on the result
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+# Set when this process can't run a pool (e.g. it is daemonic); hashing stays inline
+_pool_unavailable = False
+# Hashing jobs that may queue per worker before callers wait for a free slot
+QUEUE_PER_WORKER = 4
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password, password_hash):
+    try:
+        return bcrypt.checkpw(password, password_hash)
+    except ValueError:
+        # Malformed hash, or a password over bcrypt's 72 byte limit: it can't match
+        return False
+
+
+def _executor(workers):
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: forking a threaded server process can copy held locks
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _slots = threading.BoundedSemaphore(workers * QUEUE_PER_WORKER)
+        return _pool, _slots
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _hash_here(function, args, reason, retry=True):
+    global _pool_unavailable
+    current_app.logger.warning("Password hashing pool %s; hashing in the request thread", reason)
+    _reset_pool()
+    if not retry:
+        _pool_unavailable = True
+    return function(*args)
+
+
+def _run(function, *args):
+    workers = current_app.config['PASSWORD_HASH_WORKERS']
+    if not workers or _pool_unavailable:
+        return function(*args)
+    timeout = current_app.config['PASSWORD_HASH_TIMEOUT']
+    try:
+        pool, slots = _executor(workers)
+    except Exception as e:
+        return _hash_here(function, args, f"can't be created ({e!r})", retry=False)
+    if not slots.acquire(timeout=timeout):
+        raise TimeoutError("Password hashing is overloaded, please try again.")
+    try:
+        try:
+            # Worker processes start on the first submit
+            future = pool.submit(function, *args)
+        except (BrokenProcessPool, RuntimeError):
+            # Broken, or shut down by another thread's reset: a new pool next time
+            return _hash_here(function, args, "is broken")
+        except Exception as e:
+            # Can't start processes here at all, e.g. AssertionError inside a daemonic
+            # process: hash in the request threads for the life of this process
+            return _hash_here(function, args, f"can't start workers ({e!r})", retry=False)
+        try:
+            return future.result(timeout=timeout)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed by the OS, or the main module isn't import-safe under
+            # spawn): start a new pool next time, hash here this time
+            return _hash_here(function, args, "broke")
+    finally:
+        slots.release()
+
+
+def hash_password(password):
+    '''
+    bcrypt hash of the password at the configured cost (BCRYPT_LOG_ROUNDS)
+    '''
+    return _run(_hash, password.encode('utf-8'), current_app.config['BCRYPT_LOG_ROUNDS'])
+
+
+def check_password(password_hash, password):
+    '''
+    whether the password matches the stored bcrypt hash (text, or bytes as
+    Flask-Bcrypt stored some of them)
+    '''
+    if isinstance(password_hash, str):
+        password_hash = password_hash.encode('utf-8')
+    return _run(_check, password.encode('utf-8'), password_hash)
+
+
+def needs_rehash(password_hash):
+    '''
+    whether a stored hash was made at a different cost than BCRYPT_LOG_ROUNDS
+    (hashes look like $2b$12$..., the 12 being the cost), or is stored as bytes
+    and should be replaced by a text one
+    '''
+    if not isinstance(password_hash, str):
+        return True
+    try:
+        rounds = int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return True
+    return rounds != current_app.config['BCRYPT_LOG_ROUNDS']
@@ -0,0 +1,90 @@
+import os
+import re
+import sys
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+# Literal values are replaced so queries differing only in them count as the same query
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+class QueryBudgetExceeded(AssertionError):
+    '''
+    raised (with QUERY_AUDIT_RAISE on, e.g. in tests) when a request runs more
+    queries than its budget or repeats a query QUERY_AUDIT_REPEAT_LIMIT times
+    '''
+
+
+def _shape(statement):
+    # IN lists with a different number of parameters are still the same query
+    statement = re.sub(r'\((?:\s*\?\s*,)+\s*\?\s*\)', '(?...)', statement)
+    return ' '.join(_LITERALS.sub('?', statement).split())
+
+
+def _origin(package_root):
+    # Nearest application frames (template or Python) that led to the query: the
+    # first one, plus its caller when the first is a model helper rather than the page
+    chain = []
+    frame = sys._getframe(2)
+    while frame is not None and len(chain) < 2:
+        template = frame.f_globals.get('__jinja_template__')
+        filename = frame.f_code.co_filename
+        if template is not None:
+            chain.append(f"{template.name}:{template.get_corresponding_lineno(frame.f_lineno)}")
+        elif filename.startswith(package_root) and filename != __file__:
+            chain.append(f"{os.path.relpath(filename, os.path.dirname(package_root))}:{frame.f_lineno} "
+                         f"in {frame.f_code.co_name}")
+        if chain and not chain[0].startswith(os.path.join('website', 'models.py')):
+            break
+        frame = frame.f_back
+    return ' <- '.join(chain) or 'unknown'
+
+
+def init_app(app, engines):
+    '''
+    report SELECTs repeated within one request (N+1 patterns) with the template or
+    view line they come from, and check each endpoint against QUERY_BUDGETS
+    '''
+    package_root = app.root_path
+    repeat_limit = app.config['QUERY_AUDIT_REPEAT_LIMIT']
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not has_request_context() or 'query_audit' not in g:
+            return
+        audit = g.query_audit
+        audit['total'] += 1
+        if statement.lstrip()[:6].upper() != 'SELECT':
+            return
+        shape = _shape(statement)
+        audit['counts'][shape] += 1
+        audit['origins'].setdefault(shape, Counter())[_origin(package_root)] += 1
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+
+    @app.before_request
+    def start_query_audit():
+        g.query_audit = {'total': 0, 'counts': Counter(), 'origins': {}}
+
+    @app.after_request
+    def report_query_audit(response):
+        if 'query_audit' not in g:
+            return response
+        audit = g.query_audit
+        endpoint = request.endpoint or 'unmatched'
+        problems = []
+        for shape, count in audit['counts'].most_common():
+            if count < repeat_limit:
+                break
+            origins = ', '.join(f"{origin} ({hits}x)" for origin, hits in audit['origins'][shape].most_common(3))
+            problems.append(f"{count} x {shape[:200]}\n    from {origins}")
+        budget = app.config['QUERY_BUDGETS'].get(endpoint, app.config['QUERY_AUDIT_DEFAULT_BUDGET'])
+        if budget is not None and audit['total'] > budget:
+            problems.insert(0, f"{audit['total']} queries, over the budget of {budget}")
+        if problems:
+            report = f"Query audit for {endpoint} ({request.method} {request.path}):\n  " + '\n  '.join(problems)
+            app.logger.warning(report)
+            if app.config['QUERY_AUDIT_RAISE']:
+                raise QueryBudgetExceeded(report)
+        return response
@@ -0,0 +1,98 @@
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from .models import Event
+from . import db
+
+# How many events the homepage shows in the popular and recommended sections
+RANKING_SIZE = 3
+
+
+class Rankings:
+    '''
+    per-process cache of the homepage rankings, held as (sold_count, event_id) pairs.
+
+    Ticket sales in this process update the popular list in place; anything that can
+    change which events qualify marks the cache stale, and it is recomputed from the
+    indexed events.sold_count column at most RANKINGS_MAX_STALENESS seconds after
+    another worker's change
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.popular = []
+        self.recommended = []
+        self.computed_at = None
+
+    def _compute(self):
+        bookable = Event.status.notin_(['Cancelled', 'Inactive'])
+        # Top sellers, including past events (same rules the homepage always used)
+        self.popular = [tuple(row) for row in db.session.execute(
+            db.select(Event.sold_count, Event.id)
+            .where(bookable, Event.sold_count > 0)
+            .order_by(Event.sold_count.desc(), Event.id)
+            .limit(RANKING_SIZE))]
+        # Upcoming events with the fewest sales, newest first on ties
+        self.recommended = [tuple(row) for row in db.session.execute(
+            db.select(Event.sold_count, Event.id)
+            .where(bookable, Event.start_datetime > datetime.now())
+            .order_by(Event.sold_count.asc(), Event.created_at.desc())
+            .limit(RANKING_SIZE))]
+        self.computed_at = time.monotonic()
+
+    def get(self):
+        '''
+        return (popular_ids, recommended_ids), recomputing them if stale
+        '''
+        max_age = current_app.config['RANKINGS_MAX_STALENESS']
+        with self.lock:
+            if self.computed_at is None or time.monotonic() - self.computed_at > max_age:
+                self._compute()
+            return [event_id for _, event_id in self.popular], [event_id for _, event_id in self.recommended]
+
+    def record_sale(self, event_id, sold_count):
+        '''
+        apply a committed sale to the cached rankings without querying
+        '''
+        with self.lock:
+            if self.computed_at is None:
+                return
+            # Popular: move the event up, or in if it now beats the last place
+            others = [entry for entry in self.popular if entry[1] != event_id]
+            if len(others) < len(self.popular) or len(self.popular) < RANKING_SIZE or sold_count > self.popular[-1][0]:
+                others.append((sold_count, event_id))
+                others.sort(key=lambda entry: (-entry[0], entry[1]))
+                self.popular = others[:RANKING_SIZE]
+            # Recommended: a listed event that sold tickets may drop out, and only the
+            # database knows which event replaces it
+            if any(entry[1] == event_id for entry in self.recommended):
+                self.computed_at = None
+
+    def invalidate(self):
+        with self.lock:
+            self.computed_at = None
+
+
+def _rankings():
+    return current_app.extensions.setdefault('rankings', Rankings())
+
+
+def homepage_rankings():
+    '''
+    get the popular and recommended event ids for the homepage
+    '''
+    return _rankings().get()
+
+
+def record_ticket_sale(event):
+    '''
+    call after a booking for this event has been committed
+    '''
+    _rankings().record_sale(event.id, event.sold_count)
+
+
+def invalidate_rankings():
+    '''
+    call after an event is created, cancelled or otherwise changes eligibility
+    '''
+    _rankings().invalidate()
@@ -0,0 +1,69 @@
+import time
+from functools import wraps
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+from .engine import configure_engine
+
+# Methods that never write, so they are safe to serve from the read engine
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+class RoutingSession(Session):
+    '''
+    db.session class that sends the reads of @read_only views to the read engine;
+    flushes and INSERT/UPDATE/DELETE statements always go to the primary
+    '''
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not getattr(clause, 'is_dml', False)
+                and has_app_context() and g.get('use_read_engine')):
+            engine = current_app.extensions.get('read_engine')
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view):
+    '''
+    mark a view as a pure read so its queries run on the read engine, unless the
+    user wrote something in the last READ_YOUR_WRITES_SECONDS (their own booking
+    might not have reached a replica yet)
+    '''
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method in SAFE_METHODS and session.get('read_primary_until', 0) <= time.time():
+            g.use_read_engine = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _read_url(app, primary_engine):
+    if app.config['SQLALCHEMY_READ_URI']:
+        return app.config['SQLALCHEMY_READ_URI']
+    url = primary_engine.url
+    if url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:'):
+        # A separate read-only connection pool on the same file; with WAL these
+        # readers never block, and never wait for, the writer
+        return f'sqlite:///file:{url.database}?mode=ro&uri=true'
+    return None
+
+
+def init_app(app, db):
+    '''
+    create the read engine (DATABASE_READ_URL, or a read-only connection to the
+    SQLite file) and remember writes for read-your-writes
+    '''
+    with app.app_context():
+        read_url = _read_url(app, db.engine)
+        if read_url is not None:
+            engine = create_engine(read_url, **app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+            configure_engine(engine, app.config, read_only=True)
+            app.extensions['read_engine'] = engine
+
+    @app.after_request
+    def remember_write(response):
+        # Any successful non-GET request may have written: read this user's pages
+        # from the primary for a while so they see their own changes
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            session['read_primary_until'] = time.time() + app.config['READ_YOUR_WRITES_SECONDS']
+        return response
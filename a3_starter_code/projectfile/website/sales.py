@@ -0,0 +1,118 @@
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import delete, desc, func, insert, literal, select, update
+from sqlalchemy.orm import joinedload
+from .models import Event, Booking, SalesDaily, ticket_type
+from . import db
+
+# Columns of the creator sales export, in order
+EXPORT_COLUMNS = ['date', 'event_id', 'event', 'ticket_type', 'orders', 'tickets_sold', 'revenue']
+
+
+def creator_event_sales(user_id):
+    '''
+    the events a user created, newest first, as (event, tickets sold, revenue) rows:
+    the confirmed bookings are summed per event by the database in a single query,
+    and the remaining tickets come from the event's own counter
+    '''
+    # Confirmed bookings grouped per event, read through ix_bookings_event_status
+    sales = (select(Booking.event_id,
+                    func.sum(Booking.quantity).label('tickets_sold'),
+                    func.sum(Booking.total_price).label('revenue'))
+             .join(Event, Event.id == Booking.event_id)
+             .where(Event.created_by == user_id, Booking.booking_status == 'confirmed')
+             .group_by(Booking.event_id)
+             .subquery())
+    rows = db.session.execute(
+        select(Event, func.coalesce(sales.c.tickets_sold, 0), func.coalesce(sales.c.revenue, 0))
+        .outerjoin(sales, sales.c.event_id == Event.id)
+        .where(Event.created_by == user_id)
+        .options(joinedload(Event.genre_info))
+        .order_by(desc(Event.created_at)))
+    return [(event, int(tickets_sold), float(revenue)) for event, tickets_sold, revenue in rows]
+
+
+# ===============================
+# DAILY SALES ROLLUP
+# ===============================
+
+def _upsert_statement(dialect_name):
+    # INSERT ... ON CONFLICT DO UPDATE adds to the day's row in one statement
+    if dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    table = SalesDaily.__table__
+    statement = dialect_insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.event_id, table.c.ticket_type_id, table.c.sale_date],
+        set_={'orders': table.c.orders + statement.excluded.orders,
+              'tickets_sold': table.c.tickets_sold + statement.excluded.tickets_sold,
+              'revenue': table.c.revenue + statement.excluded.revenue,
+              'updated_at': statement.excluded.updated_at})
+
+
+def record_daily_sales(event_id, cart_items, sold_at=None):
+    '''
+    add an order's items to today's sales_daily rows, in the current transaction
+    '''
+    sold_at = sold_at or datetime.now()
+    rows = [{'event_id': event_id, 'ticket_type_id': item['ticket_type_id'], 'sale_date': sold_at.date(),
+             'orders': 1, 'tickets_sold': item['quantity'], 'revenue': Decimal(str(item['subtotal'])),
+             'updated_at': sold_at}
+            for item in cart_items]
+    statement = _upsert_statement(db.engine.dialect.name)
+    if statement is not None:
+        db.session.execute(statement, rows)
+        return
+    # Other databases: update the day's row, or start it
+    table = SalesDaily.__table__
+    for row in rows:
+        result = db.session.execute(
+            update(table)
+            .where(table.c.event_id == row['event_id'], table.c.ticket_type_id == row['ticket_type_id'],
+                   table.c.sale_date == row['sale_date'])
+            .values(orders=table.c.orders + row['orders'], tickets_sold=table.c.tickets_sold + row['tickets_sold'],
+                    revenue=table.c.revenue + row['revenue'], updated_at=row['updated_at']))
+        if result.rowcount == 0:
+            db.session.execute(insert(table), row)
+
+
+def rebuild_sales_daily():
+    '''
+    refill sales_daily from the confirmed bookings (for history from before the
+    rollup existed, or after bookings were changed outside the booking routes);
+    returns the number of rows written
+    '''
+    table = SalesDaily.__table__
+    sale_date = func.date(Booking.booking_date)
+    db.session.execute(delete(table))
+    result = db.session.execute(insert(table).from_select(
+        ['event_id', 'ticket_type_id', 'sale_date', 'orders', 'tickets_sold', 'revenue', 'updated_at'],
+        select(Booking.event_id, Booking.ticket_type_id, sale_date,
+               func.count(func.distinct(Booking.order_id)), func.sum(Booking.quantity),
+               func.sum(Booking.total_price), literal(datetime.now(), db.DateTime))
+        .where(Booking.booking_status == 'confirmed', Booking.booking_date.is_not(None))
+        .group_by(Booking.event_id, Booking.ticket_type_id, sale_date)))
+    db.session.commit()
+    return result.rowcount
+
+
+def creator_sales_rows(user_id, event_id=None):
+    '''
+    the daily sales of a creator's events (or one of them) from the rollup, as rows in
+    EXPORT_COLUMNS order; a generator that runs the query on the first row and
+    fetches the rows in chunks as they are consumed
+    '''
+    query = (select(SalesDaily.sale_date, Event.id, Event.name, ticket_type.type_name,
+                    SalesDaily.orders, SalesDaily.tickets_sold, SalesDaily.revenue)
+             .join(Event, Event.id == SalesDaily.event_id)
+             .join(ticket_type, ticket_type.id == SalesDaily.ticket_type_id)
+             .where(Event.created_by == user_id)
+             # The unique constraint's column order, so the rows are read in index order without a sort
+             .order_by(SalesDaily.event_id, SalesDaily.ticket_type_id, SalesDaily.sale_date))
+    if event_id is not None:
+        query = query.where(SalesDaily.event_id == event_id)
+    yield from db.session.execute(query.execution_options(yield_per=1000))
@@ -0,0 +1,25 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+from .search import create_search_index
+from . import db
+
+
+def upgrade_schema():
+    '''
+    bring an existing database up to date with the models:
+    create missing tables, add missing columns and create missing indexes,
+    then build the full-text search index
+    '''
+    db.create_all()
+    inspector = inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    # New columns need a server_default so existing rows satisfy NOT NULL
+                    column_ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column_ddl}'))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        create_search_index(conn)
@@ -0,0 +1,100 @@
+import re
+from flask import current_app
+from sqlalchemy import column, literal_column, or_, select, table, text
+from .models import Event
+from . import db
+
+# Full-text index over the searchable event columns, stored as an SQLite FTS5
+# "external content" table: it holds only the index and reads text from events
+FTS_TABLE = 'events_fts'
+FTS_COLUMNS = ['name', 'description', 'artist_info', 'venue', 'location']
+# bm25 weight per column (same order as FTS_COLUMNS) - a match in the name counts most
+FTS_WEIGHTS = [10.0, 1.0, 5.0, 2.0, 2.0]
+
+_columns = ', '.join(FTS_COLUMNS)
+_new_values = ', '.join(f'new.{name}' for name in FTS_COLUMNS)
+_old_values = ', '.join(f'old.{name}' for name in FTS_COLUMNS)
+
+# Triggers keep the index in step with every write to events, including raw SQL writes
+FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({_columns}, content='events', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON events BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON events BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+    END""",
+    # Only fires when a searchable column changes, so ticket counter updates don't touch the index
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {_columns} ON events BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END""",
+]
+
+# Whether the current database has the index, cached per engine URL
+_fts_ready = {}
+
+
+def create_search_index(conn):
+    '''
+    create the FTS5 index and its triggers, then (re)build it from the events table;
+    returns False when the database is not SQLite or SQLite was built without FTS5
+    '''
+    if conn.dialect.name != 'sqlite':
+        return False
+    try:
+        for statement in FTS_DDL:
+            conn.execute(text(statement))
+    except Exception as e:
+        # "no such module: fts5" - searches fall back to LIKE
+        current_app.logger.warning(f"Full-text search index not created: {e}")
+        return False
+    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    return True
+
+
+def fts_available():
+    '''
+    check whether the events full-text index exists in the current database
+    '''
+    engine = db.engine
+    key = str(engine.url)
+    if key not in _fts_ready:
+        ready = False
+        if engine.dialect.name == 'sqlite':
+            with engine.connect() as conn:
+                ready = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {'name': FTS_TABLE}).first() is not None
+        _fts_ready[key] = ready
+    return _fts_ready[key]
+
+
+def fts_match_expression(search_text):
+    '''
+    turn free text into an FTS5 query: every word must match, as a prefix,
+    with each word quoted so user input can't inject FTS5 syntax
+    '''
+    words = re.findall(r'\w+', search_text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_events(query, search_text):
+    '''
+    filter an Event query by search text; returns the filtered query and a
+    relevance column to order by (lower is better), or None if there is no ranking
+    '''
+    match = fts_match_expression(search_text)
+    if match and fts_available():
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        fts = table(FTS_TABLE, column('rowid'))
+        matches = (select(fts.c.rowid.label('event_id'),
+                          literal_column(f'bm25({FTS_TABLE}, {weights})').label('rank'))
+                   .select_from(fts)
+                   .where(literal_column(FTS_TABLE).op('MATCH')(match))
+                   .subquery())
+        return query.join(matches, matches.c.event_id == Event.id), matches.c.rank
+
+    # No FTS5 available: fall back to a substring scan of the same columns
+    pattern = f"%{search_text}%"
+    return query.filter(or_(*(getattr(Event, name).ilike(pattern) for name in FTS_COLUMNS))), None
@@ -0,0 +1,270 @@
+import random
+from bisect import bisect
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import accumulate
+from sqlalchemy import bindparam, func, insert, select, update
+from .models import User, Genre, Event, ticket_type, Order, OrderItem, Booking, Comment
+from .sales import rebuild_sales_daily
+from .passwords import hash_password
+from . import db
+
+# Every seeded user can log in with this password
+SEED_PASSWORD = 'password'
+
+FIRST_NAMES = ['Olivia', 'Noah', 'Charlotte', 'Oliver', 'Amelia', 'Jack', 'Isla', 'William', 'Mia', 'Leo',
+               'Ava', 'Henry', 'Grace', 'Lucas', 'Chloe', 'Thomas', 'Zoe', 'James', 'Ella', 'Ethan',
+               'Ruby', 'Mason', 'Sophie', 'Hudson', 'Harper', 'Archie', 'Evie', 'Liam', 'Willow', 'Kai']
+SURNAMES = ['Smith', 'Jones', 'Williams', 'Brown', 'Wilson', 'Taylor', 'Nguyen', 'Johnson', 'Martin', 'White',
+            'Anderson', 'Walker', 'Thompson', 'Thomas', 'Lee', 'Ryan', 'Robinson', 'Kelly', 'King', 'Harris',
+            'Chen', 'Davies', 'Singh', 'Wright', 'Hall', 'Clarke', 'Young', 'Mitchell', 'Campbell', 'Scott']
+STREETS = ['George Street', 'Queen Street', 'Adelaide Street', 'Ann Street', 'Boundary Street', 'Brunswick Street',
+           'Coronation Drive', 'Elizabeth Street', 'Grey Street', 'Logan Road', 'Main Street', 'Wickham Terrace']
+CITIES = ['Brisbane', 'Sydney', 'Melbourne', 'Perth', 'Adelaide', 'Gold Coast', 'Canberra', 'Hobart',
+          'Newcastle', 'Darwin', 'Cairns', 'Townsville']
+VENUES = ['Arena', 'Entertainment Centre', 'Town Hall', 'Riverstage', 'Amphitheatre', 'Showgrounds',
+          'Convention Centre', 'Theatre', 'Hotel', 'Warehouse', 'Park', 'Club']
+NAME_WORDS = ['Midnight', 'Electric', 'Golden', 'Velvet', 'Neon', 'Wild', 'Silver', 'Summer', 'Echo', 'Northern',
+              'Crimson', 'Coastal', 'Lost', 'Rising', 'Static', 'Hollow', 'Paper', 'Broken', 'Lunar', 'Desert']
+NAME_NOUNS = ['Sessions', 'Nights', 'Festival', 'Tour', 'Live', 'Showcase', 'Weekender', 'Parade', 'Revival',
+              'Sound System', 'Orchestra', 'Collective', 'Jam', 'Gala', 'Unplugged']
+COMMENTS = ['Can\'t wait for this one!', 'Best night of the year last time.', 'Is there parking at the venue?',
+            'Bought tickets for the whole group.', 'Hoping they play the old songs.', 'What time do doors open?',
+            'Sound was amazing last year.', 'Anyone selling a spare VIP ticket?', 'First time seeing them live!',
+            'The support act is worth getting there early for.', 'Is this all ages?', 'See you all at the front.']
+
+# (name, price range, share of the event's capacity); events get the first 1-4 types
+TICKET_TYPES = [
+    ('General Admission', (39, 129), 0.70),
+    ('VIP', (149, 399), 0.10),
+    ('Early Bird', (29, 89), 0.15),
+    ('Student', (25, 69), 0.05),
+]
+# Tickets per order item: mostly one or two
+QUANTITY_WEIGHTS = {1: 45, 2: 35, 3: 8, 4: 9, 6: 2, 8: 1}
+# Share of events that were cancelled and of orders that were cancelled afterwards
+CANCELLED_EVENT_SHARE = 0.02
+CANCELLED_ORDER_SHARE = 0.03
+
+
+def _cents(value):
+    return Decimal(value).scaleb(-2)
+
+
+def _next_id(model):
+    return (db.session.scalar(select(func.max(model.id))) or 0) + 1
+
+
+class _Inserter:
+    '''
+    collects rows for one table and writes them with executemany in batches;
+    the tables its rows reference (parents) are written first
+    '''
+    def __init__(self, model, batch_size, parents=()):
+        self.table = model.__table__
+        self.batch_size = batch_size
+        self.parents = parents
+        self.rows = []
+        self.count = 0
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for parent in self.parents:
+            parent.flush()
+        if self.rows:
+            db.session.execute(insert(self.table), self.rows)
+            self.count += len(self.rows)
+            self.rows = []
+
+
+def seed_database(users, events, orders, comments, seed=0, batch_size=10000, echo=print):
+    '''
+    add generated users, events, ticket types, orders (with their items and bookings)
+    and comments. Event popularity follows a power law, so a few blockbusters take
+    most of the sales and sell out while the long tail sells a handful of tickets.
+
+    The same seed always generates the same rows; dates are offsets from the start
+    of the current day. Rows are added after any existing ones, with the ticket
+    counters and daily sales rollup filled in; the search index triggers index the
+    new events.
+    Returns {table name: rows added}
+    '''
+    rng = random.Random(seed)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    genres = db.session.execute(select(Genre.id, Genre.image_filename).order_by(Genre.id)).all()
+    if not genres:
+        raise ValueError("No genres in the database; run create_db.py first.")
+    password_hash = hash_password(SEED_PASSWORD)
+
+    # --- users: about one in fifty creates events
+    first_user = _next_id(User)
+    user_rows = _Inserter(User, batch_size)
+    creator_ids = []
+    for user_id in range(first_user, first_user + users):
+        joined = today - timedelta(days=rng.randint(30, 1000), seconds=rng.randint(0, 86399))
+        role = 'creator' if rng.random() < 0.02 else 'attendee'
+        if role == 'creator':
+            creator_ids.append(user_id)
+        user_rows.add({
+            'id': user_id, 'firstName': rng.choice(FIRST_NAMES), 'surname': rng.choice(SURNAMES),
+            'email': f'user{user_id}@seed.example.com', 'mobileNumber': f'05{user_id:08d}',
+            'streetAddress': f'{rng.randint(1, 400)} {rng.choice(STREETS)}, {rng.choice(CITIES)}',
+            'password_hash': password_hash, 'role': role, 'created_at': joined, 'updated_at': joined,
+        })
+    user_rows.flush()
+    db.session.commit()
+    echo(f"Added {user_rows.count} users.")
+    user_ids = range(first_user, first_user + users)
+    creator_ids = creator_ids or list(user_ids[:1])
+
+    # --- events and their ticket types; popularity decides capacity and sales
+    first_event = _next_id(Event)
+    first_ticket = _next_id(ticket_type)
+    popularity = [1 / (rank ** 1.2) for rank in range(1, events + 1)]
+    rng.shuffle(popularity)
+    total_popularity = sum(popularity)
+    # Tickets an order buys on average, to size capacity against expected demand
+    average_quantity = (sum(quantity * weight for quantity, weight in QUANTITY_WEIGHTS.items())
+                        / sum(QUANTITY_WEIGHTS.values()) * 1.3)
+    event_rows = _Inserter(Event, batch_size)
+    ticket_rows = _Inserter(ticket_type, batch_size, parents=[event_rows])
+    event_info = []  # (event id, start, cancelled, [[ticket id, price cents, remaining, sold], ...])
+    ticket_id = first_ticket
+    for index, event_id in enumerate(range(first_event, first_event + events)):
+        genre_id, genre_image = rng.choice(genres)
+        start = today + timedelta(days=rng.randint(-120, 240), hours=rng.choice([12, 17, 18, 19, 20, 21]))
+        created = min(start, today) - timedelta(days=rng.randint(14, 180))
+        cancelled = rng.random() < CANCELLED_EVENT_SHARE
+        city = rng.choice(CITIES)
+        name = f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_NOUNS)}"
+        # Demand is uneven: capacity between well short of and well above the expected sales
+        expected = orders * popularity[index] / total_popularity * average_quantity
+        capacity = max(50, int(expected * rng.uniform(0.6, 2.5)))
+        tickets = []
+        for type_name, (low, high), share in TICKET_TYPES[:rng.choice([1, 2, 2, 3, 4])]:
+            price = rng.randint(low, high) * 100 + rng.choice([0, 0, 50, 95])
+            quantity = max(10, int(capacity * share))
+            tickets.append([ticket_id, price, quantity, 0])
+            ticket_rows.add({
+                'id': ticket_id, 'event_id': event_id, 'type_name': type_name,
+                'description': f'{type_name} entry', 'price': price / 100,
+                'quantity_available': quantity, 'sold_count': 0,
+                'created_at': created, 'updated_at': created,
+            })
+            ticket_id += 1
+        event_info.append((event_id, start, cancelled, tickets))
+        event_rows.add({
+            'id': event_id, 'name': name,
+            'description': f'{name} brings a night of live music to {city}.',
+            'image_filename': genre_image, 'start_datetime': start, 'location': city,
+            'venue': f'{city} {rng.choice(VENUES)}', 'genre_id': genre_id,
+            'artist_info': f'{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)} and band',
+            'status': 'Cancelled' if cancelled else 'Open',
+            'age_limit': rng.choice([None, None, 15, 18]), 'length': rng.choice(['2 hours', '3 hours', '5 hours']),
+            'created_by': rng.choice(creator_ids), 'created_at': created, 'updated_at': created,
+        })
+    ticket_rows.flush()
+    db.session.commit()
+    echo(f"Added {event_rows.count} events with {ticket_rows.count} ticket types.")
+
+    # --- orders, each with one or two items and a booking per item
+    cumulative_popularity = list(accumulate(popularity))
+    quantities = list(QUANTITY_WEIGHTS)
+    cumulative_quantity = list(accumulate(QUANTITY_WEIGHTS.values()))
+    order_rows = _Inserter(Order, batch_size)
+    item_rows = _Inserter(OrderItem, batch_size, parents=[order_rows])
+    booking_rows = _Inserter(Booking, batch_size, parents=[order_rows])
+    order_id = _next_id(Order)
+    item_id = _next_id(OrderItem)
+    booking_id = _next_id(Booking)
+    for _ in range(orders):
+        event_id, start, cancelled, tickets = event_info[
+            bisect(cumulative_popularity, rng.random() * cumulative_popularity[-1])]
+        available = [ticket for ticket in tickets if ticket[2] > 0]
+        if cancelled or not available:
+            # Nothing left to buy for this event; the buyer goes elsewhere
+            continue
+        user_id = rng.choice(user_ids)
+        # Sales happen before the event and not in the future
+        ordered = min(start, today) - timedelta(days=rng.expovariate(1 / 20), seconds=rng.randint(0, 86399))
+        status = 'cancelled' if rng.random() < CANCELLED_ORDER_SHARE else 'confirmed'
+        items = []
+        for ticket in rng.sample(available, min(len(available), 1 if rng.random() < 0.8 else 2)):
+            quantity = min(ticket[2], quantities[bisect(cumulative_quantity, rng.random() * cumulative_quantity[-1])])
+            if status == 'confirmed':
+                ticket[2] -= quantity
+                ticket[3] += quantity
+            items.append((ticket[0], ticket[1], quantity))
+        order_rows.add({
+            'id': order_id, 'user_id': user_id, 'event_id': event_id,
+            'total_amount': _cents(sum(price * quantity for _, price, quantity in items)),
+            'order_status': status, 'order_date': ordered, 'created_at': ordered, 'updated_at': ordered,
+        })
+        for ticket_id, price, quantity in items:
+            item_rows.add({
+                'id': item_id, 'order_id': order_id, 'ticket_type_id': ticket_id, 'quantity': quantity,
+                'unit_price': _cents(price), 'subtotal': _cents(price * quantity), 'created_at': ordered,
+            })
+            booking_rows.add({
+                'id': booking_id, 'user_id': user_id, 'event_id': event_id, 'order_id': order_id,
+                'ticket_type_id': ticket_id, 'quantity': quantity, 'total_price': _cents(price * quantity),
+                'booking_status': status, 'booking_date': ordered, 'created_at': ordered, 'updated_at': ordered,
+            })
+            item_id += 1
+            booking_id += 1
+        order_id += 1
+        if order_rows.count and not order_rows.rows:
+            # The orders batch was just written: write its items and bookings and commit
+            item_rows.flush()
+            booking_rows.flush()
+            db.session.commit()
+    item_rows.flush()
+    booking_rows.flush()
+    db.session.commit()
+    echo(f"Added {order_rows.count} orders with {item_rows.count} items and {booking_rows.count} bookings.")
+
+    # --- counters: the generator knows every ticket type's sales, so no recount is needed
+    ticket_counts = [{'ticket_id': ticket[0], 'remaining': ticket[2], 'sold': ticket[3]}
+                     for _, _, _, tickets in event_info for ticket in tickets if ticket[3]]
+    if ticket_counts:
+        db.session.execute(
+            update(ticket_type.__table__)
+            .where(ticket_type.__table__.c.id == bindparam('ticket_id'))
+            .values(quantity_available=bindparam('remaining'), sold_count=bindparam('sold')),
+            ticket_counts)
+    event_counts = []
+    for event_id, _, cancelled, tickets in event_info:
+        remaining = sum(ticket[2] for ticket in tickets)
+        status = 'Cancelled' if cancelled else 'Sold Out' if remaining == 0 else 'Open'
+        event_counts.append({'event_id': event_id, 'sold': sum(ticket[3] for ticket in tickets),
+                             'remaining': remaining, 'new_status': status})
+    db.session.execute(
+        update(Event.__table__)
+        .where(Event.__table__.c.id == bindparam('event_id'))
+        .values(sold_count=bindparam('sold'), remaining_count=bindparam('remaining'), status=bindparam('new_status')),
+        event_counts)
+    db.session.commit()
+
+    # --- comments, mostly on the popular events
+    comment_rows = _Inserter(Comment, batch_size)
+    first_comment = _next_id(Comment)
+    for comment_id in range(first_comment, first_comment + comments):
+        event_id, start, _, _ = event_info[bisect(cumulative_popularity, rng.random() * cumulative_popularity[-1])]
+        posted = min(start, today) - timedelta(days=rng.expovariate(1 / 30), seconds=rng.randint(0, 86399))
+        comment_rows.add({
+            'id': comment_id, 'text': rng.choice(COMMENTS), 'user_id': rng.choice(user_ids),
+            'event_id': event_id, 'created_at': posted, 'is_edited': False,
+        })
+    comment_rows.flush()
+    db.session.commit()
+    echo(f"Added {comment_rows.count} comments.")
+    echo(f"Rebuilt the daily sales rollup ({rebuild_sales_daily()} rows).")
+    return {
+        'users': user_rows.count, 'events': event_rows.count, 'ticket_type': ticket_rows.count,
+        'orders': order_rows.count, 'order_items': item_rows.count, 'bookings': booking_rows.count,
+        'comments': comment_rows.count,
+    }
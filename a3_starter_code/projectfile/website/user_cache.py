@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+from .models import User
+from .routing import RoutingSession
+from . import db
+
+
+class UserCache:
+    '''
+    in-process LRU of users' column values by id, so Flask-Login's user_loader can
+    skip the users query on each authenticated request. Entries expire after
+    USER_CACHE_TTL seconds (how long another worker's change can go unseen); changes
+    made through this process's ORM remove the entry straight away
+    '''
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user_id, values):
+        with self.lock:
+            self.entries[user_id] = (time.monotonic(), values)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_COLUMNS = [column.key for column in inspect(User).column_attrs]
+
+
+def load_user(user_id):
+    '''
+    the User for Flask-Login's session id, from the cache when it's there: the cached
+    values become a User in the current session without querying (merge with
+    load=False), so lazy relationships and later changes work as on a queried one
+    '''
+    cache = current_app.extensions.get('user_cache')
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    if cache is None:
+        return db.session.get(User, user_id)
+    values = cache.get(user_id)
+    if values is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            cache.set(user_id, {key: getattr(user, key) for key in _COLUMNS})
+        return user
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def invalidate_user(user_id):
+    '''
+    drop a user from this process's cache, e.g. after changing users with a bulk
+    UPDATE (which, unlike ORM changes, isn't seen by the listeners below)
+    '''
+    if has_app_context() and current_app.extensions.get('user_cache') is not None:
+        current_app.extensions['user_cache'].invalidate(user_id)
+
+
+# ===============================
+# INVALIDATION
+# ===============================
+
+def _user_changed(mapper, connection, target):
+    # Drop it now, and again at commit: a request loading the user between the flush
+    # and the commit still reads (and may re-cache) the old row
+    invalidate_user(target.id)
+    session = inspect(target).session
+    if session is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+
+def _after_commit(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        invalidate_user(user_id)
+
+
+def _after_rollback(session):
+    session.info.pop('changed_user_ids', None)
+
+
+event.listen(User, 'after_update', _user_changed)
+event.listen(User, 'after_delete', _user_changed)
+event.listen(RoutingSession, 'after_commit', _after_commit)
+event.listen(RoutingSession, 'after_rollback', _after_rollback)
+
+
+def init_app(app):
+    '''
+    cache logged-in users; USER_CACHE_SIZE = 0 queries the user on every request
+    '''
+    max_size = app.config['USER_CACHE_SIZE']
+    app.extensions['user_cache'] = UserCache(max_size, app.config['USER_CACHE_TTL']) if max_size else None
@@ -1,16 +1,22 @@
-from flask import Blueprint, render_template, request, session, redirect, url_for, flash, abort
+from flask import Blueprint, Response, render_template, request, session, redirect, url_for, flash, abort, stream_with_context
 from flask_login import login_required, current_user
 from .models import Event, Booking, Order, OrderItem, User
 from .forms import ChangePasswordForm, ProfileUpdateForm
+from .rankings import homepage_rankings
+from .routing import read_only
+from .sales import creator_event_sales, creator_sales_rows, EXPORT_COLUMNS
+from .exports import stream_csv
+from .passwords import hash_password, check_password
 from sqlalchemy import desc, text, func
+from sqlalchemy.orm import contains_eager, selectinload
 from sqlalchemy.exc import IntegrityError
-from flask_bcrypt import check_password_hash, generate_password_hash
 from . import db
 from datetime import datetime
 
 main_bp = Blueprint('main', __name__)
 
 @main_bp.route('/')
+@read_only
 def index():
     # Filter out cancelled and inactive events - only show upcoming active events
     upcoming_events = Event.query.filter(
@@ -18,23 +24,12 @@ def index():
         Event.start_datetime > datetime.now()  # Only future events
     ).order_by(Event.start_datetime.asc()).all()
     
-    # Get popular events based on ticket sales (including past events for popularity)
-    popular_events_query = db.session.query(
-        Event,
-        func.sum(Booking.quantity).label('total_tickets_sold')
-    ).join(
-        Booking, Event.id == Booking.event_id
-    ).filter(
-        Booking.booking_status == 'confirmed',
-        Event.status.notin_(['Cancelled', 'Inactive'])
-    ).group_by(
-        Event.id
-    ).order_by(
-        text('total_tickets_sold DESC')
-    ).limit(3).all()
-    
-    # Extract just the Event objects from the query results
-    popular_events = [result[0] for result in popular_events_query] if popular_events_query else []
+    # Popular (most tickets sold) and recommended (fewest sold, need promotion) events come
+    # from the precomputed rankings instead of aggregating the bookings table on every hit
+    popular_ids, recommended_ids = homepage_rankings()
+    ranked_events = {event.id: event for event in
+                     Event.query.filter(Event.id.in_(popular_ids + recommended_ids)).all()}
+    popular_events = [ranked_events[event_id] for event_id in popular_ids if event_id in ranked_events]
     
     # If we don't have enough popular events with sales, fill with upcoming events
     if len(popular_events) < 3:
@@ -45,24 +40,7 @@ def index():
                            if event.id not in popular_event_ids][:remaining_count]
         popular_events.extend(additional_events)
     
-    # Get recommended events (events with least ticket sales - need promotion)
-    # Use LEFT JOIN to include events with no bookings (0 sales)
-    recommended_events_query = db.session.query(
-        Event,
-        func.coalesce(func.sum(Booking.quantity), 0).label('total_tickets_sold')
-    ).outerjoin(  # LEFT JOIN to include events with no bookings
-        Booking, (Event.id == Booking.event_id) & (Booking.booking_status == 'confirmed')
-    ).filter(
-        Event.status.notin_(['Cancelled', 'Inactive']),
-        Event.start_datetime > datetime.now()  # Only future events for recommendations
-    ).group_by(
-        Event.id
-    ).order_by(
-        text('total_tickets_sold ASC'),  # Ascending - events with 0 sales come first
-        Event.created_at.desc()  # Then by newest for events with same sales
-    ).limit(3).all()
-    
-    recommended_events = [result[0] for result in recommended_events_query] if recommended_events_query else []
+    recommended_events = [ranked_events[event_id] for event_id in recommended_ids if event_id in ranked_events]
     
     return render_template('index.html', 
                          events=upcoming_events, 
@@ -72,19 +50,17 @@ def index():
 @main_bp.route('/booking-history')
 @login_required
 def booking_history():
-    # Get only orders for the current user
+    # Get only orders for the current user, with everything the page shows loaded up front:
+    # the event from the join, then all order items and their ticket types in one query each,
+    # so the page runs the same few queries however many orders the user has
     user_orders = (Order.query
                   .filter_by(user_id=current_user.id)
-                  .join(Event)
+                  .join(Order.event)
+                  .options(contains_eager(Order.event),
+                           selectinload(Order.order_items).joinedload(OrderItem.ticket_type))
                   .order_by(desc(Order.order_date))
                   .all())
     
-    # Get events created by the current user
-    user_created_events = (Event.query
-                          .filter_by(created_by=current_user.id)
-                          .order_by(desc(Event.created_at))
-                          .all())
-    
     # Organize order history for the template
     booking_history = []
     
@@ -109,22 +85,15 @@ def booking_history():
         }
         booking_history.append(order_info)
     
-    # Organize created events data
+    # Organize created events data; tickets sold and revenue are summed in one query for all of them
     creation_history = []
-    for event in user_created_events:
-        # Calculate total bookings and revenue for this event
-        total_bookings = sum(booking.quantity for booking in event.bookings if booking.booking_status == 'confirmed')
-        total_revenue = sum(float(booking.total_price) for booking in event.bookings if booking.booking_status == 'confirmed')
-        
-        # Calculate available tickets
-        total_available = sum(ticket.quantity_available for ticket in event.ticket_types)
-        
+    for event, tickets_sold, total_revenue in creator_event_sales(current_user.id):
         creation_info = {
                          'event': event,
                          'created_date': event.created_at,
-                         'total_bookings': total_bookings,
+                         'total_bookings': tickets_sold,
                          'total_revenue': total_revenue,
-                         'available_tickets': total_available,
+                         'available_tickets': event.remaining_count,
                          'status': event.current_status
                          }
         creation_history.append(creation_info)
@@ -133,6 +102,19 @@ def booking_history():
                          booking_history=booking_history, 
                          creation_history=creation_history)
 
+@main_bp.route('/booking-history/sales.csv')
+@login_required
+def sales_export():
+    '''
+    stream the daily sales of the current user's events (or ?event_id= one of them) as CSV
+    '''
+    event_id = request.args.get('event_id', type=int)
+    filename = f'sales-event-{event_id}.csv' if event_id else 'sales.csv'
+    # Streamed in chunks as the rows are fetched, so memory stays flat however long the export
+    rows = creator_sales_rows(current_user.id, event_id)
+    return Response(stream_with_context(stream_csv(EXPORT_COLUMNS, rows)),
+                    mimetype='text/csv', headers={'Content-Disposition': f'attachment; filename={filename}'})
+
 @main_bp.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
@@ -142,7 +124,7 @@ def profile():
     if form.validate_on_submit():
         try:
             # Verify current password first
-            if not check_password_hash(current_user.password_hash, form.current_password.data):
+            if not check_password(current_user.password_hash, form.current_password.data):
                 flash('Current password is incorrect.', 'danger')
                 return render_template('auth/profile.html', form=form)
             
@@ -161,7 +143,7 @@ def profile():
             
             # Update password if provided
             if form.new_password.data:
-                current_user.password_hash = generate_password_hash(form.new_password.data)
+                current_user.password_hash = hash_password(form.new_password.data)
                 updates.append('password')
             
             # Update the updated_at timestamp